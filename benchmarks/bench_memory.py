@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Compare memory retained by a parsed machine with records and with dicts.
+
+The dict layout is the one used before the records were introduced: each
+element is a dict and optional keys are present only when set.
+
+    $ python3 benchmarks/bench_memory.py --events 20000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eventb_to_txt.machine import Machine  # noqa: E402
+from eventb_to_txt.records import Record  # noqa: E402
+
+from generator import generate_machine  # noqa: E402
+
+
+def as_dict(record):
+    res = dict()
+
+    for field in record.fields():
+        value = getattr(record, field)
+
+        if value is None or value == ():
+            continue
+        if isinstance(value, list):
+            value = [as_dict(x) for x in value]
+
+        res[field] = value
+
+    return res
+
+
+def containers_size(obj):
+    # Size of records, dicts and lists, without the strings they refer to
+    if isinstance(obj, list):
+        return sys.getsizeof(obj) + sum(containers_size(x) for x in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(containers_size(x) for x in obj.values())
+    if isinstance(obj, Record):
+        return sys.getsizeof(obj) + sum(
+            containers_size(getattr(obj, x)) for x in obj.fields()
+        )
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--guards", type=int, default=5)
+    parser.add_argument("--predicate-length", type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "M.bum")
+        generate_machine(path, args.events, args.guards, args.predicate_length)
+
+        gc.collect()
+        tracemalloc.start()
+        m = Machine(path)
+        gc.collect()
+        total = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+    elements = m.variables + m.invariants + m.events
+    records = containers_size(elements)
+    dicts = containers_size([as_dict(x) for x in elements])
+    strings = total - records
+
+    print("machine: {} events, {} guards per event".format(args.events, args.guards))
+    print("{:8} {:>12} {:>12}".format("", "elements", "total"))
+    for name, size in (("records", records), ("dicts", dicts)):
+        print(
+            "{:8} {:9.1f} MB {:9.1f} MB".format(
+                name, size / 1024 / 1024, (strings + size) / 1024 / 1024
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Compare the streaming (iterparse) and DOM engines of the machine parser.
+
+Each engine runs in a separate process, so that peak RSS values do not
+affect each other:
+
+    $ python3 benchmarks/bench_parse.py --events 20000
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eventb_to_txt.abstract import iterparse_elements, parse_elements  # noqa: E402
+from eventb_to_txt.machine import Machine  # noqa: E402
+
+from generator import generate_machine  # noqa: E402
+
+ENGINES = {"iterparse": iterparse_elements, "dom": parse_elements}
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if sys.platform == "darwin":
+        rss /= 1024
+    return rss / 1024
+
+
+def worker(engine, path):
+    class BenchMachine(Machine):
+        iter_elements = staticmethod(ENGINES[engine])
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    m = BenchMachine(path)
+    elapsed = time.perf_counter() - start
+
+    print(elapsed, peak_rss_mb() - baseline, len(m.events))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--guards", type=int, default=5)
+    parser.add_argument("--predicate-length", type=int, default=200)
+    parser.add_argument("--worker", nargs=2, metavar=("ENGINE", "PATH"))
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(*args.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "M.bum")
+        generate_machine(path, args.events, args.guards, args.predicate_length)
+        size = os.path.getsize(path) / 1024 / 1024
+
+        print("machine: {} events, {:.1f} MB".format(args.events, size))
+
+        for engine in ENGINES:
+            out = subprocess.check_output(
+                [sys.executable, __file__, "--worker", engine, path],
+                universal_newlines=True,
+            )
+            elapsed, rss, _ = out.split()
+
+            print(
+                "{:10} time {:7.3f} s   peak RSS +{:7.1f} MB".format(
+                    engine, float(elapsed), float(rss)
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
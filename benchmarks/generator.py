@@ -0,0 +1,245 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Deterministic generator of synthetic Event-B models for benchmarks.
+
+A model consists of a chain of machines M0 refines ... refines M<depth-1>
+and of contexts C0 ... C<contexts-1>. Each context extends the previous
+one and up to fan-out - 1 other earlier contexts, and each machine sees
+up to fan-out random contexts, so the dependency graph is a wide DAG.
+The same parameters and seed always produce the same files.
+
+    $ python3 benchmarks/generator.py OUT_DIR --events 500 --depth 10
+"""
+
+import argparse
+import os
+import random
+
+from xml.sax.saxutils import quoteattr
+
+HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+CORE = "org.eventb.core."
+
+
+class Generator:
+    def __init__(
+        self,
+        events=100,
+        guards=5,
+        predicate_length=40,
+        depth=3,
+        contexts=2,
+        fan_out=2,
+        comments=0.2,
+        seed=0,
+    ):
+        if min(events, guards, depth, contexts) < 0:
+            raise ValueError("Numbers of elements must be non-negative")
+
+        if fan_out < 1:
+            raise ValueError("Fan-out must be positive")
+
+        self.events = events
+        self.guards = guards
+        self.predicate_length = predicate_length
+        self.depth = depth
+        self.contexts = contexts
+        self.fan_out = fan_out
+        self.comments = comments
+        self.random = random.Random(seed)
+
+    def generate_model(self, model_path):
+        """Write all contexts and machines of the model to model_path."""
+        os.makedirs(model_path, exist_ok=True)
+
+        for i in range(self.contexts):
+            self.generate_context(os.path.join(model_path, "C%d.buc" % i), i)
+
+        for i in range(self.depth):
+            self.generate_machine(os.path.join(model_path, "M%d.bum" % i), i)
+
+    def generate_context(self, path, index):
+        with open(path, "w", encoding="utf8") as f:
+            f.write(HEADER)
+            attrs = {"configuration": CORE + "fwd", "version": "3"}
+            f.write(self.__open("contextFile", **attrs))
+
+            if index:
+                others = self.__sample(range(index - 1), self.fan_out - 1)
+
+                for i in [index - 1] + others:
+                    f.write(self.__element("extendsContext", target="C%d" % i))
+
+            f.write(self.__element("carrierSet", identifier="S%d" % index))
+
+            for i in range(self.events):
+                f.write(self.__element("constant", identifier="c%d_%d" % (index, i)))
+
+            for i in range(self.events):
+                attrs = {
+                    "label": "axm%d" % i,
+                    "predicate": "c{}_{} ∈ S{}".format(index, i, index),
+                }
+                f.write(self.__element("axiom", **attrs))
+
+            f.write(self.__close("contextFile"))
+
+    def generate_machine(self, path, index):
+        with open(path, "w", encoding="utf8") as f:
+            f.write(HEADER)
+            attrs = {"configuration": CORE + "fwd", "version": "5"}
+            f.write(self.__open("machineFile", **attrs))
+
+            if index:
+                attrs = {"target": "M%d" % (index - 1)}
+                f.write(self.__element("refinesMachine", **attrs))
+
+            for i in self.__sample(range(self.contexts), self.fan_out):
+                f.write(self.__element("seesContext", target="C%d" % i))
+
+            for i in range(self.events):
+                f.write(self.__element("variable", identifier="v%d_%d" % (index, i)))
+
+            for i in range(self.events):
+                attrs = {
+                    "label": "inv%d" % i,
+                    "predicate": "v%d_%d ∈ ℕ" % (index, i),
+                }
+                f.write(self.__element("invariant", **attrs))
+
+            attrs = {"convergence": "0", "extended": "false", "label": "INITIALISATION"}
+            f.write(self.__open("event", **attrs))
+            for i in range(self.events):
+                attrs = {
+                    "label": "act%d" % i,
+                    "assignment": "v%d_%d ≔ 0" % (index, i),
+                }
+                f.write(self.__element("action", **attrs))
+            f.write(self.__close("event"))
+
+            for i in range(self.events):
+                self.__write_event(f, index, i)
+
+            f.write(self.__close("machineFile"))
+
+    def __write_event(self, f, index, i):
+        attrs = {"convergence": "0", "extended": "false", "label": "evt%d" % i}
+        f.write(self.__open("event", **attrs))
+
+        if index:
+            f.write(self.__element("refinesEvent", target="evt%d" % i))
+
+        f.write(self.__element("parameter", identifier="p"))
+
+        for j in range(self.guards):
+            attrs = {"label": "grd%d" % j, "predicate": self.__predicate(index, i)}
+            f.write(self.__element("guard", **attrs))
+
+        if index:
+            f.write(self.__element("witness", label="p", predicate="p = 0"))
+
+        assignment = "v{0}_{1} ≔ v{0}_{1} + p".format(index, i)
+        f.write(self.__element("action", label="act1", assignment=assignment))
+        f.write(self.__close("event"))
+
+    def __sample(self, indices, size):
+        # Random non-empty subset of at most size indices, in their order
+        if not indices:
+            return []
+
+        size = self.random.randint(1, min(size, len(indices)))
+        return sorted(self.random.sample(indices, size))
+
+    def __predicate(self, index, i):
+        res = "p ∈ ℕ"
+
+        # Guards can only refer to variables of the machine
+        if not self.events:
+            return res
+
+        while len(res) < self.predicate_length:
+            k = self.random.randrange(self.events)
+            res += " ∧ v%d_%d ≠ %d" % (index, k, self.random.randrange(100))
+        return res
+
+    def __attrs(self, attrs):
+        res = ""
+        for key, value in attrs.items():
+            if key != "version":
+                key = CORE + key
+            res += " {}={}".format(key, quoteattr(value))
+
+        if self.random.random() < self.comments:
+            res += " {}={}".format(CORE + "comment", quoteattr("generated\ncomment"))
+
+        return res
+
+    def __element(self, tag, **attrs):
+        name = quoteattr(str(self.random.getrandbits(32)))
+        return "<{}{} name={}{}/>\n".format(CORE, tag, name, self.__attrs(attrs))
+
+    def __open(self, tag, **attrs):
+        if tag.endswith("File"):
+            return "<{}{}{}>\n".format(CORE, tag, self.__attrs(attrs))
+
+        name = quoteattr(str(self.random.getrandbits(32)))
+        return "<{}{} name={}{}>\n".format(CORE, tag, name, self.__attrs(attrs))
+
+    def __close(self, tag):
+        return "</{}{}>\n".format(CORE, tag)
+
+
+def generate_machine(path, events=1000, guards=5, predicate_length=40):
+    """Write a single machine with the given number of events to path."""
+    Generator(events, guards, predicate_length).generate_machine(path, 0)
+
+
+def add_arguments(parser):
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--guards", type=int, default=5)
+    parser.add_argument("--predicate-length", type=int, default=40)
+    parser.add_argument("--depth", help="number of machines", type=int, default=3)
+    parser.add_argument("--contexts", help="number of contexts", type=int, default=2)
+    parser.add_argument(
+        "--fan-out",
+        help="maximum number of contexts extended or seen by a component",
+        type=int,
+        default=2,
+    )
+    parser.add_argument(
+        "--comments", help="share of commented elements", type=float, default=0.2
+    )
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def from_arguments(args):
+    return Generator(
+        args.events,
+        args.guards,
+        args.predicate_length,
+        args.depth,
+        args.contexts,
+        args.fan_out,
+        args.comments,
+        args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("out_path", help="directory of the generated model")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        gen = from_arguments(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    gen.generate_model(args.out_path)
+
+
+if __name__ == "__main__":
+    main()
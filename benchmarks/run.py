@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Benchmark suite of the converter on a generated model.
+
+Discovery, parsing, dependency ordering, rendering and writing are timed
+separately for the per-file, merge and stdout output modes. Results are
+stored as JSON, so that runs on different commits can be compared:
+
+    $ python3 benchmarks/run.py --events 1000 --depth 10 -o before.json
+    $ python3 benchmarks/run.py --events 1000 --depth 10 -o after.json \\
+          --compare before.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eventb_to_txt.graph import DependencyGraph  # noqa: E402
+from eventb_to_txt.model import Model  # noqa: E402
+from eventb_to_txt.output import write_txt  # noqa: E402
+from eventb_to_txt.source import DirectorySource  # noqa: E402
+
+import generator  # noqa: E402
+
+MODES = {"per-file": False, "merge": True, "stdout": True}
+
+
+def best_time(func, repeat, setup=None):
+    # If setup is given, its result is passed to func and is not timed
+    res = None
+
+    for _ in range(repeat):
+        args = [setup()] if setup else []
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        res = elapsed if res is None else min(res, elapsed)
+
+    return res
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(model_dir, out_dir, repeat):
+    results = dict()
+
+    source = DirectorySource(model_dir)
+    results["discovery"] = best_time(source.find_model_paths, repeat)
+    model_path = source.find_model_paths()[0]
+
+    def load():
+        # Components are parsed lazily, they are parsed here at once
+        model = Model(model_path, source=source)
+        model.model_objs
+        return model
+
+    results["parse"] = best_time(load, repeat)
+    model = load()
+
+    results["ordering"] = best_time(
+        lambda: DependencyGraph(model.model_objs).order(), repeat
+    )
+
+    for mode, merge in MODES.items():
+        rendered = model.render(merge)
+        # Components keep their text once rendered, so each repetition
+        # renders a freshly parsed model
+        mode_results = {
+            "render": best_time(lambda m: m.render(merge), repeat, setup=load)
+        }
+
+        if mode == "stdout":
+            with open(os.devnull, "w", encoding="utf8") as devnull:
+                with contextlib.redirect_stdout(devnull):
+                    mode_results["write"] = best_time(
+                        lambda: write_txt(rendered, "-", merge), repeat
+                    )
+        else:
+            mode_results["write"] = best_time(
+                lambda: write_txt(rendered, out_dir, merge), repeat
+            )
+
+        results[mode] = mode_results
+
+    return results
+
+
+def compare(results, baseline, prefix=""):
+    for key, value in results.items():
+        if key not in baseline:
+            continue
+
+        if isinstance(value, dict):
+            compare(value, baseline[key], prefix + key + ".")
+        else:
+            print(
+                "{:22} {:9.4f} s -> {:9.4f} s  ({:+.1%})".format(
+                    prefix + key, baseline[key], value, value / baseline[key] - 1
+                )
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    generator.add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", help="store results to the JSON file")
+    parser.add_argument("--compare", help="compare with results from the JSON file")
+    args = parser.parse_args()
+
+    try:
+        gen = generator.from_arguments(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = os.path.join(tmp, "model")
+        out_dir = os.path.join(tmp, "out")
+        os.makedirs(out_dir)
+
+        gen.generate_model(model_dir)
+        size = sum(e.stat().st_size for e in os.scandir(model_dir))
+
+        results = {
+            "commit": get_commit(),
+            "python": platform.python_version(),
+            "parameters": {
+                k: v for k, v in vars(args).items() if k not in ("output", "compare")
+            },
+            "model_size": size,
+            "results": run(model_dir, out_dir, args.repeat),
+        }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf8") as f:
+            baseline = json.load(f)
+
+        compare(results["results"], baseline["results"])
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
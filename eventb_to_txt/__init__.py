@@ -1,3 +1,13 @@
 # Copyright (c) 2018 Ilya Shchepetkov
 # Use of this source code is governed by the MIT license that can be
 # found in the LICENSE file.
+
+__version__ = "1.6"
+
+from eventb_to_txt.api import (  # noqa: E402, F401
+    load_component,
+    load_models,
+    render_component,
+    render_model,
+    write_model,
+)
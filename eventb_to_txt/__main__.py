@@ -5,13 +5,36 @@
 # found in the LICENSE file.
 
 import argparse
+import concurrent.futures
+import contextlib
 import os
-import shutil
+import socket
 import sys
-import tempfile
+import tarfile
 import zipfile
 
+from eventb_to_txt import stats
+from eventb_to_txt.cache import Cache, DEFAULT_CACHE_SIZE, TextCache
+from eventb_to_txt.diff import STATUSES, compare
+from eventb_to_txt.index import INDEX_NAME
 from eventb_to_txt.model import Model
+from eventb_to_txt.output import write_txt
+from eventb_to_txt.shard import Shard, parse_shard
+from eventb_to_txt.source import (
+    DEFAULT_IGNORE,
+    DirectorySource,
+    GitSource,
+    MemorySource,
+    ZipSource,
+    is_tarfile,
+    strip_archive_ext,
+)
+
+# Model directory of components of an archive read from stdin
+STDIN_ROOT = "stdin"
+
+# Archive errors which are reported as failed conversions
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, EOFError)
 
 
 def main(args=sys.argv[1:]):
@@ -32,16 +55,153 @@ def main(args=sys.argv[1:]):
         default=False,
     )
     parser.add_argument(
-        help="path to the Event-B model directory or zipfile",
-        dest="in_path",
-        nargs=argparse.OPTIONAL,
-        default=os.getcwd(),
+        "--skip-unchanged",
+        help="do not rewrite txt files which content would not change",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="convert models in N parallel processes (0 means one per CPU)",
+        metavar="N",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--component",
+        help="convert only the component NAME and components it depends on",
+        metavar="NAME",
+    )
+    parser.add_argument(
+        "--index",
+        help="store dependency graphs of models in {} files of model directories"
+        " and reuse them while component files are unchanged".format(INDEX_NAME),
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--shard",
+        help="convert only the INDEX-th of COUNT size-balanced parts of models"
+        " and write their manifest to the output directory",
+        metavar="INDEX/COUNT",
+        type=parse_shard,
+    )
+    parser.add_argument(
+        "--rev",
+        help="read component files from the git revision REV of repositories"
+        " given as paths, without a checkout",
+        metavar="REV",
+    )
+    parser.add_argument(
+        "--ignore",
+        help="skip files and directories matching PATTERN (default: {})".format(
+            " ".join(DEFAULT_IGNORE)
+        ),
+        metavar="PATTERN",
+        action="append",
+        default=[],
+    )
+    parser.add_argument(
+        "--nested",
+        help="include component files of subdirectories into the parent model",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="reuse txt of unchanged components cached in the PATH directory",
+        dest="cache_dir",
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "--cache-size",
+        help="limit the size of the cache to SIZE megabytes (default: %(default)s)",
+        metavar="SIZE",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+    )
+    parser.add_argument(
+        "--stats",
+        help="write timing and memory statistics in JSON to PATH (default: stderr)",
+        metavar="PATH",
+        nargs="?",
+        const="-",
+    )
+    parser.add_argument(
+        "--diff",
+        help="compare with the OLD version of the model: write txt files of"
+        " changed and added components only and print a summary of changes",
+        metavar="OLD",
+    )
+    parser.add_argument(
+        "--watch",
+        help="keep running and convert models again when their files change",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--serve",
+        help="run a daemon which keeps parsed models in memory and converts"
+        " models on requests received on the Unix SOCKET",
+        metavar="SOCKET",
+    )
+    parser.add_argument(
+        "--connect",
+        help="send the conversion request to the daemon listening on SOCKET",
+        metavar="SOCKET",
+    )
+    parser.add_argument(
+        help="paths to Event-B model directories, zip or tar archives or"
+        " component files; - reads an archive from stdin, @FILE reads more"
+        " paths from FILE, one per line, and @- from stdin",
+        dest="in_paths",
+        metavar="in_path",
+        nargs="*",
     )
 
     args = parser.parse_args(args)
 
-    if not os.path.exists(args.in_path):
-        sys.exit("{!r} path does not exist".format(args.in_path))
+    try:
+        in_paths = _read_in_paths(args.in_paths or [os.getcwd()])
+    except OSError as e:
+        sys.exit("{}: Can't read the list of paths: {}".format(type(e).__name__, e))
+
+    # Stdin is read by @-, by "-" inputs and by --diff -
+    stdin_reads = (
+        (args.in_paths or []).count("@-") + in_paths.count("-") + (args.diff == "-")
+    )
+    if stdin_reads > 1:
+        sys.exit("Stdin can be read only once")
+
+    if not in_paths:
+        sys.exit("No paths to convert")
+
+    if len(in_paths) == 1:
+        args.in_path = in_paths[0]
+
+        if args.in_path != "-" and not os.path.exists(args.in_path):
+            sys.exit("{!r} path does not exist".format(args.in_path))
+    elif args.watch or args.connect:
+        sys.exit("Only a single path can be watched or sent to the daemon")
+
+    if "-" in in_paths and (args.watch or args.connect):
+        sys.exit("An archive read from stdin can't be watched or sent to the daemon")
+
+    if args.rev and (args.watch or args.connect):
+        sys.exit("A git revision can't be watched or sent to the daemon")
+
+    if args.rev and "-" in in_paths:
+        sys.exit("A git revision can't be read from stdin")
+
+    if args.diff and (len(in_paths) > 1 or args.watch or args.connect or args.shard):
+        sys.exit("Only a single path can be compared, without a daemon or shards")
+
+    if args.diff and args.merge:
+        sys.exit("Changed components are written to separate txt files")
+
+    if args.diff and args.diff != "-" and not os.path.exists(args.diff):
+        sys.exit("{!r} path does not exist".format(args.diff))
 
     if args.out_path == "-":
         args.merge = True
@@ -55,31 +215,453 @@ def main(args=sys.argv[1:]):
                 )
             )
 
-    is_zipfile = False
-    if zipfile.is_zipfile(args.in_path):
-        is_zipfile = True
+    if args.jobs < 0:
+        sys.exit("Number of jobs must be a non-negative integer")
 
-        tmp_in = tempfile.mkdtemp()
+    if args.watch and args.out_path == "-":
+        sys.exit("Txt files can't be watched when printed to stdout")
 
-        with zipfile.ZipFile(args.in_path) as zip_f:
-            zip_f.extractall(tmp_in)
+    if args.watch and args.shard:
+        sys.exit("Shards of models can't be watched")
+
+    if (args.serve or args.connect) and not hasattr(socket, "AF_UNIX"):
+        sys.exit("Unix sockets are not available on this platform")
+
+    if args.connect:
+        return _convert_remote(args)
+
+    cache = None
+    if args.cache_dir:
+        try:
+            cache = Cache(args.cache_dir, args.cache_size)
+        except OSError as e:
+            sys.exit(
+                "{}: Can't create cache directory {!r}".format(
+                    type(e).__name__, args.cache_dir
+                )
+            )
+
+    if args.serve:
+        return _serve(args.serve, cache)
+
+    if args.stats:
+        stats.enable()
+
+    # Each of several inputs is converted into its own subdirectory
+    if len(in_paths) == 1:
+        targets = [(args.in_path, args.out_path)]
+    else:
+        targets = list(zip(in_paths, _get_out_paths(in_paths, args.out_path)))
 
-        args.in_path = tmp_in
+    failed = 0
+    written = unchanged = 0
 
     try:
-        for model_path in Model.find_model_paths(args.in_path):
-            m = Model(model_path)
-            m.print(args.out_path, args.merge)
+        if args.watch:
+            return _watch(args, cache)
+
+        if args.diff:
+            return _diff(args)
+
+        with contextlib.ExitStack() as stack:
+            # Worker processes are shared by all inputs
+            executor = None
+            if args.jobs != 1:
+                executor = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(args.jobs or None)
+                )
+
+            for in_path, out_path in targets:
+                try:
+                    w, u = _convert(
+                        in_path, out_path, args, cache, executor, len(targets) > 1
+                    )
+                except (RuntimeError, OSError) + ARCHIVE_ERRORS as e:
+                    # A bad input does not stop the batch
+                    if len(targets) == 1:
+                        raise
+
+                    failed += 1
+                    print("{}: {}".format(in_path, _format_error(e)), file=sys.stderr)
+                    continue
+
+                written += w
+                unchanged += u
     except RuntimeError as e:
         raise SystemExit(e)
-    except (OSError, PermissionError) as e:
-        raise SystemExit("{}: {}".format(type(e).__name__, e))
+    except (OSError, PermissionError) + ARCHIVE_ERRORS as e:
+        raise SystemExit(_format_error(e))
+    finally:
+        if args.stats:
+            _dump_stats(args.stats)
 
-    if is_zipfile:
-        shutil.rmtree(args.in_path)
+    if cache:
+        cache.trim()
+        print(cache.get_stats(), file=sys.stderr)
 
     if args.out_path != "-":
+        if not failed:
+            print("Txt files were successfully generated")
+
+        if args.skip_unchanged:
+            print("{} files written, {} unchanged".format(written, unchanged))
+
+    if failed:
+        sys.exit("{} of {} paths were not converted".format(failed, len(targets)))
+
+
+def _read_in_paths(args):
+    # Expand @FILE and @- arguments into the listed paths
+    in_paths = []
+
+    for arg in args:
+        if not arg.startswith("@"):
+            in_paths.append(arg)
+            continue
+
+        if arg == "@-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(arg[1:], encoding="utf8") as f:
+                lines = f.read().splitlines()
+
+        in_paths.extend(x.strip() for x in lines if x.strip())
+
+    return in_paths
+
+
+def _get_out_paths(in_paths, out_path):
+    # Subdirectories are named after inputs, model.zip is converted into
+    # OUT/model; inputs with the same names get numbered suffixes
+    if out_path == "-":
+        return [out_path] * len(in_paths)
+
+    res = []
+    used = set()
+
+    for in_path in in_paths:
+        name = os.path.basename(os.path.abspath(in_path))
+
+        if in_path == "-":
+            name = STDIN_ROOT
+        elif os.path.isfile(in_path):
+            name = strip_archive_ext(name)
+
+        candidate = name
+        i = 2
+        while candidate in used:
+            candidate = "{}-{}".format(name, i)
+            i += 1
+
+        used.add(candidate)
+        res.append(os.path.join(out_path, candidate))
+
+    return res
+
+
+def _format_error(e):
+    if isinstance(e, RuntimeError):
+        return str(e)
+
+    return "{}: {}".format(type(e).__name__, e)
+
+
+def _open_source(in_path, args):
+    ignore = list(DEFAULT_IGNORE) + args.ignore
+
+    if args.rev:
+        with stats.phase("archive"):
+            return GitSource(in_path, args.rev, ignore, args.nested)
+
+    # Archives are read into memory without being extracted
+    if in_path == "-":
+        with stats.phase("archive"):
+            return MemorySource.from_archive(
+                sys.stdin.buffer, os.path.abspath(STDIN_ROOT), ignore, args.nested
+            )
+
+    if zipfile.is_zipfile(in_path):
+        with stats.phase("archive"):
+            return ZipSource(in_path, ignore, args.nested)
+
+    if is_tarfile(in_path):
+        root = strip_archive_ext(os.path.abspath(in_path))
+
+        with stats.phase("archive"), open(in_path, "rb") as f:
+            return MemorySource.from_tar(f, root, ignore, args.nested)
+
+    return DirectorySource(in_path, ignore, args.nested)
+
+
+def _find_model_paths(source, args):
+    with stats.phase("discovery"):
+        model_paths = source.find_model_paths()
+
+    if args.component:
+        model_paths = Model.filter_model_paths(model_paths, args.component, source)
+
+    return model_paths
+
+
+def _convert(in_path, out_path, args, cache, executor=None, share_texts=False):
+    # Convert models of a single input, return written and unchanged numbers.
+    # Components are streamed to their txt files; worker processes build
+    # texts anyway, and share them between models of several inputs
+    if in_path != "-" and not os.path.exists(in_path):
+        raise RuntimeError("{!r} path does not exist".format(in_path))
+
+    if out_path != "-":
+        os.makedirs(out_path, exist_ok=True)
+
+    with contextlib.closing(_open_source(in_path, args)) as source:
+        model_paths = _find_model_paths(source, args)
+
+        if args.shard:
+            shard = Shard(*args.shard, model_paths, source)
+            model_paths = shard.model_paths
+
+        # Model path -> names of its txt files
+        outputs = dict()
+
+        # Components that can't be parsed do not stop the conversion,
+        # they are reported after all txt files are written
+        errors = []
+
+        if executor is None:
+            written = unchanged = 0
+
+            for model_path in model_paths:
+                m = Model(model_path, cache, source, args.component, args.index)
+                w, u = m.print(out_path, args.merge, args.skip_unchanged, release=True)
+                outputs[model_path] = m.get_txt_names(args.merge)
+                errors.extend("{}: {}".format(*x) for x in m.errors.items())
+                written += w
+                unchanged += u
+        else:
+            written, unchanged = _convert_parallel(
+                executor,
+                model_paths,
+                out_path,
+                args,
+                cache,
+                source,
+                outputs,
+                errors,
+                share_texts,
+            )
+
+        if args.shard and out_path != "-":
+            shard.write_manifest(out_path, outputs)
+
+    if errors:
+        raise RuntimeError("\n".join(errors))
+
+    return written, unchanged
+
+
+def _serve(socket_path, cache):
+    # Imported here, as Unix sockets are not available on every platform
+    from eventb_to_txt.server import Server
+
+    try:
+        server = Server(socket_path, cache)
+    except OSError as e:
+        sys.exit("{}: Can't listen on {!r}".format(type(e).__name__, socket_path))
+
+    print("Listening on {}".format(socket_path), file=sys.stderr)
+
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    if cache:
+        cache.trim()
+
+
+def _watch(args, cache):
+    from eventb_to_txt.watch import Watcher
+
+    with contextlib.closing(_open_source(args.in_path, args)) as source:
+        _find_model_paths(source, args)
+
+        watcher = Watcher(
+            source,
+            args.out_path,
+            args.merge,
+            args.skip_unchanged,
+            cache,
+            args.component,
+        )
+        watcher.poll()
+
         print("Txt files were successfully generated")
+        print("Watching for changes, press Ctrl+C to stop")
+
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+
+    if cache:
+        cache.trim()
+
+
+def _diff(args):
+    with contextlib.ExitStack() as stack:
+        old_source = stack.enter_context(
+            contextlib.closing(_open_source(args.diff, args))
+        )
+        new_source = stack.enter_context(
+            contextlib.closing(_open_source(args.in_path, args))
+        )
+
+        with stats.phase("compare"):
+            changes = compare(old_source, new_source)
+
+        # Only changed and added components are rendered
+        output = [
+            (x.component.get_component_name() + ".txt", x.component)
+            for x in changes
+            if x.component is not None
+        ]
+        written, unchanged = write_txt(
+            output, args.out_path, False, args.skip_unchanged
+        )
+
+    # The summary does not mix with txt printed to stdout
+    out = sys.stderr if args.out_path == "-" else sys.stdout
+
+    for change in changes:
+        print(change, file=out)
+
+    counts = [sum(x.status == s for x in changes) for s in STATUSES]
+    print("Components: {} changed, {} added, {} removed".format(*counts), file=out)
+
+    if args.skip_unchanged and args.out_path != "-":
+        print("{} files written, {} unchanged".format(written, unchanged))
+
+
+def _convert_remote(args):
+    from eventb_to_txt.server import send_request
+
+    request = {
+        "in_path": os.path.abspath(args.in_path),
+        "out_path": (
+            args.out_path if args.out_path == "-" else os.path.abspath(args.out_path)
+        ),
+        "merge": args.merge,
+        "component": args.component,
+        "skip_unchanged": args.skip_unchanged,
+        "ignore": list(DEFAULT_IGNORE) + args.ignore,
+        "nested": args.nested,
+    }
+
+    try:
+        response = send_request(args.connect, request)
+    except (OSError, ValueError) as e:
+        sys.exit("{}: Can't connect to {!r}".format(type(e).__name__, args.connect))
+
+    if "error" in response:
+        sys.exit(response["error"])
+
+    if args.out_path == "-":
+        sys.stdout.write(response["output"])
+    else:
+        if "errors" not in response:
+            print("Txt files were successfully generated")
+
+        if args.skip_unchanged:
+            print(
+                "{} files written, {} unchanged".format(
+                    response["written"], response["unchanged"]
+                )
+            )
+
+    if "errors" in response:
+        sys.exit("\n".join(response["errors"]))
+
+
+def _dump_stats(path):
+    s = stats.get_active()
+    stats.disable()
+
+    if path == "-":
+        s.dump(sys.stderr)
+    else:
+        with open(path, "w", encoding="utf8") as f:
+            s.dump(f)
+
+
+# Texts shared by models of several inputs rendered in a worker process
+_worker_texts = TextCache()
+
+
+def _render_model(model_path, args, cache, source, record_stats, share_texts):
+    # Runs in a worker process: exceptions are returned as text, so that
+    # a broken model does not hide the results of the other ones.
+    # The cache and stats are returned to collect their statistics
+    worker_stats = stats.enable() if record_stats else None
+
+    try:
+        texts = _worker_texts if share_texts else None
+        m = Model(model_path, cache, source, args.component, args.index, texts)
+        rendered = m.render(args.merge)
+        error = "\n".join("{}: {}".format(*x) for x in m.errors.items()) or None
+    except RuntimeError as e:
+        rendered, error = None, str(e)
+    except Exception as e:
+        rendered, error = None, "{}: {}".format(type(e).__name__, e)
+    finally:
+        stats.disable()
+
+    return rendered, error, cache, worker_stats
+
+
+def _convert_parallel(
+    executor, model_paths, out_path, args, cache, source, outputs, errors, share_texts
+):
+    written = unchanged = 0
+
+    # Each task gets only the component files of its model
+    futures = [
+        executor.submit(
+            _render_model,
+            model_path,
+            args,
+            cache,
+            source.for_model(model_path),
+            bool(args.stats),
+            share_texts,
+        )
+        for model_path in model_paths
+    ]
+
+    # Results are written in the same order as in the serial mode
+    for model_path, future in zip(model_paths, futures):
+        rendered, error, worker_cache, worker_stats = future.result()
+
+        if cache:
+            cache.add_stats(worker_cache.hits, worker_cache.misses)
+
+        if worker_stats:
+            stats.get_active().merge(worker_stats)
+
+        if rendered is None:
+            errors.append("{}: {}".format(model_path, error))
+            continue
+
+        # Errors of single components come with their paths
+        if error:
+            errors.append(error)
+
+        outputs[model_path] = list(dict.fromkeys(x for x, _ in rendered))
+        w, u = write_txt(rendered, out_path, args.merge, args.skip_unchanged)
+        written += w
+        unchanged += u
+
+    return written, unchanged
 
 
 if __name__ == "__main__":
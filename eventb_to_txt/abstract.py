@@ -2,11 +2,47 @@
 # Use of this source code is governed by the MIT license that can be
 # found in the LICENSE file.
 
+import abc
 import io
 import os
+import xml.etree.ElementTree as ET
 
+from eventb_to_txt import stats, text
 
-class EventBComponent:
+
+def iterparse_elements(source):
+    """Yield the root element and then each of its children once it is parsed.
+
+    Processed children are dropped from the tree, so only one top-level
+    element (for example, one event) is kept in memory at a time.
+    """
+    root = None
+    depth = 0
+
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+                yield root
+
+            depth += 1
+        else:
+            depth -= 1
+
+            if depth == 1:
+                yield elem
+                root.clear()
+
+
+def parse_elements(source):
+    """Same as iterparse_elements(), but builds the whole tree first."""
+    root = ET.parse(source).getroot()
+
+    yield root
+    yield from root
+
+
+class EventBComponent(abc.ABC):
     COMMENT = "org.eventb.core.comment"
     ID = "org.eventb.core.identifier"
     LABEL = "org.eventb.core.label"
@@ -15,32 +51,155 @@ class EventBComponent:
     TARGET = "org.eventb.core.target"
 
     # Tab size must be even
-    TAB_SIZE = 4
-    TAB = " " * TAB_SIZE
+    TAB_SIZE = text.TAB_SIZE
+    TAB = text.TAB
     HALFTAB = " " * int(TAB_SIZE / 2)
 
+    # Engine used to read elements of the component file
+    iter_elements = staticmethod(iterparse_elements)
+
     def __init__(self, component):
         self.path = component
         self.head = {"name": os.path.basename(os.path.splitext(self.path)[0])}
+        # Rendered text, restored from the cache or kept by __str__()
+        self._text = None
+
+    def _load(self, parse, cache=None, fileobj=None):
+        """Parse the component file or restore it from the cache.
+
+        If fileobj is given, the component is read from it instead of path.
+        If it has a content_id attribute, the cache is looked up by it, and
+        fileobj is not read at all on a cache hit.
+        """
+        # Text rendered before is stale once the component is parsed again
+        self._text = None
+
+        if fileobj is None:
+            with open(self.path, "rb") as f:
+                self._load(parse, cache, f)
+            return
+
+        if cache is None:
+            parse(fileobj)
+            return
+
+        name = os.path.basename(self.path)
+        content_id = getattr(fileobj, "content_id", None)
+
+        if content_id is not None:
+            key = cache.id_key(name, content_id)
+        else:
+            data = fileobj.read()
+            key = cache.key(name, data)
+
+        entry = cache.get(key)
+
+        if entry is not None:
+            self._set_cache_entry(entry)
+            self._text = entry["text"]
+            return
+
+        if content_id is not None:
+            data = fileobj.read()
+
+        parse(io.BytesIO(data))
+
+        entry = self._get_cache_entry()
+        entry["text"] = str(self)
+        cache.put(key, entry)
+
+    @abc.abstractmethod
+    def _get_cache_entry(self):
+        """Return dependency metadata stored in the cache next to the text."""
+
+    @abc.abstractmethod
+    def _set_cache_entry(self, entry):
+        """Restore dependency metadata from a cache entry."""
 
     def get_component_name(self):
         return self.head["name"]
 
-    def _to_str_comment(self, data):
+    @abc.abstractmethod
+    def get_dependencies(self):
+        """Return names of refined, seen and extended components."""
+
+    def _to_str_comment(self, comment):
         res = ""
-        if data.get("comment"):
-            if data["comment"].strip():
+        if comment:
+            if comment.strip():
                 res += " // "
-                comment = data["comment"].replace("\r\n", "\n")
-                comment = comment.replace("\n", " ")
-                res += comment
+                res += text.join_lines(comment)
             else:
-                comment = data["comment"].replace("\r\n", "\n")
-                res += comment
+                res += text.normalize_newlines(comment)
 
         res += "\n"
         return res
 
-    def _post_process_str(self, string):
-        # trim trailing whitespaces
-        return "".join([line.rstrip() + "\n" for line in string.splitlines()])
+    @abc.abstractmethod
+    def _render(self):
+        """Yield pieces of the txt representation."""
+
+    def render_to(self, stream):
+        """Write the txt representation of the component to stream.
+
+        Text is written piece by piece, trailing whitespaces of each line
+        are trimmed on the fly, so the whole text is not kept in memory.
+        Text already returned by str() is written as it is.
+        """
+        if self._text is not None:
+            stream.write(self._text)
+            return
+
+        with stats.phase("render", self.path):
+            writer = _TrimmingWriter(stream)
+
+            for piece in self._render():
+                writer.write(piece)
+
+            writer.close()
+
+    def __str__(self):
+        # The text is kept, so it is rendered once however often it is asked
+        if self._text is None:
+            stream = io.StringIO()
+            self.render_to(stream)
+            self._text = stream.getvalue()
+
+        return self._text
+
+    def to_txt(self, out_path, merge=False):
+        exists = os.path.exists(out_path)
+
+        with open(out_path, "a", encoding="utf8") as f:
+            if merge and exists:
+                f.write("\n\n")
+
+            self.render_to(f)
+
+
+class _TrimmingWriter:
+    # Writes text to the stream, trimming trailing whitespaces of each line.
+    # Lines are split in the same way as str.splitlines() does it
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.tail = ""
+
+    def write(self, text):
+        lines = (self.tail + text).splitlines(True)
+        self.tail = ""
+
+        if lines:
+            last = lines[-1]
+
+            # The last line is not finished yet ("\r" may be followed by "\n")
+            if last.splitlines()[0] == last or last.endswith("\r"):
+                self.tail = lines.pop()
+
+        if lines:
+            self.stream.write("".join(line.rstrip() + "\n" for line in lines))
+
+    def close(self):
+        if self.tail:
+            self.stream.write(self.tail.rstrip() + "\n")
+            self.tail = ""
@@ -0,0 +1,104 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Conversion of components and models held in memory.
+
+Nothing is read from or written to the file system:
+
+    files = {"C0.buc": b"<?xml ...", "M0.bum": b"<?xml ..."}
+    for txt_name, text in eventb_to_txt.render_model(files):
+        ...
+
+A model is given either as a mapping of file names to bytes or binary
+file objects, or as a zip or tar archive in bytes or a binary stream.
+"""
+
+import collections.abc
+import io
+
+from eventb_to_txt.cache import TextCache
+from eventb_to_txt.context import Context
+from eventb_to_txt.machine import Machine
+from eventb_to_txt.model import Model
+from eventb_to_txt.source import (
+    DEFAULT_IGNORE,
+    MemorySource,
+    is_context_file,
+    is_machine_file,
+)
+
+
+def load_component(data, name, cache=None):
+    """Parse a context or a machine given as bytes or a binary file object.
+
+    The extension of name (.buc or .bum) tells which one it is.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        data = io.BytesIO(data)
+
+    if is_context_file(name):
+        return Context(name, cache, data)
+    elif is_machine_file(name):
+        return Machine(name, cache, data)
+
+    raise RuntimeError("{!r} is neither a context nor a machine".format(name))
+
+
+def render_component(data, name):
+    """Return txt of a context or a machine given as bytes or a file object."""
+    return str(load_component(data, name))
+
+
+def load_models(
+    files, name="model", ignore=DEFAULT_IGNORE, nested=False, cache=None, component=None
+):
+    """Parse all models in files and return a list of Model objects.
+
+    Components stored at the top level of files belong to a model called
+    name, so in the merge mode they are written to "<name>.txt".
+    """
+    if isinstance(files, collections.abc.Mapping):
+        source = MemorySource(files, name, ignore, nested)
+    else:
+        source = MemorySource.from_archive(files, name, ignore, nested)
+
+    model_paths = source.find_model_paths()
+
+    if component:
+        model_paths = Model.filter_model_paths(model_paths, component, source)
+
+    # Identical components of several models are rendered once
+    texts = TextCache()
+    return [Model(x, cache, source, component, texts=texts) for x in model_paths]
+
+
+def render_model(files, merge=False, **kwargs):
+    """Return a list of (txt file name, text) pairs of all models in files.
+
+    Keyword arguments are passed to load_models(). RuntimeError is raised
+    if some component can't be parsed.
+    """
+    res = []
+
+    for model in load_models(files, **kwargs):
+        res.extend(model.render(merge))
+        _check_errors(model)
+
+    return res
+
+
+def write_model(files, stream, merge=False, **kwargs):
+    """Write txt of all models in files to the stream.
+
+    Components are written one after another, in the merge mode in the
+    order of their dependencies, in the same way as with "-o -".
+    """
+    for model in load_models(files, **kwargs):
+        model.write_to(stream, merge)
+        _check_errors(model)
+
+
+def _check_errors(model):
+    if model.errors:
+        raise RuntimeError("\n".join("{}: {}".format(*x) for x in model.errors.items()))
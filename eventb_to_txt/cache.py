@@ -0,0 +1,164 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from eventb_to_txt import __version__
+
+# Format of cache entries, which must be bumped whenever the rendered text
+# or the stored metadata change, so that older entries are not used
+CACHE_FORMAT = 2
+
+# Default cache size limit in megabytes
+DEFAULT_CACHE_SIZE = 256
+
+# Default limit of the total length of texts kept in memory, in characters
+DEFAULT_TEXT_CACHE_SIZE = 64 * 1024 * 1024
+
+
+class Cache:
+    """On-disk cache of rendered components.
+
+    Entries are keyed by the hash of the component file name and content
+    together with the tool version and CACHE_FORMAT, and contain the
+    rendered text and the refines, sees and extends relations of the
+    component.
+    """
+
+    def __init__(self, cache_dir, max_size=DEFAULT_CACHE_SIZE):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(name, data):
+        h = hashlib.sha256()
+        h.update("{}\0{}\0".format(__version__, CACHE_FORMAT).encode("utf8"))
+        h.update(name.encode("utf8") + b"\0")
+        h.update(data)
+        return h.hexdigest()
+
+    @staticmethod
+    def id_key(name, content_id):
+        """Key by an identifier of the content, such as a git blob hash."""
+        h = hashlib.sha256()
+        h.update("{}\0{}\0id\0".format(__version__, CACHE_FORMAT).encode("utf8"))
+        h.update(name.encode("utf8") + b"\0")
+        h.update(content_id.encode("utf8"))
+        return h.hexdigest()
+
+    def __entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key):
+        path = self.__entry_path(key)
+
+        try:
+            with open(path, encoding="utf8") as f:
+                entry = json.load(f)
+
+            # Recently used entries are evicted last
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+
+        try:
+            with os.fdopen(fd, "w", encoding="utf8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+
+            os.replace(tmp_path, self.__entry_path(key))
+        except OSError:
+            # Cache is an optimisation, failing to fill it is not an error
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def trim(self):
+        """Remove least recently used entries until the cache fits in max_size."""
+        entries = []
+        size = 0
+
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            size += st.st_size
+
+        entries.sort()
+
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+            size -= entry_size
+
+    def add_stats(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0
+
+        return "Cache: {} hits, {} misses ({:.0%} hit rate)".format(
+            self.hits, self.misses, rate
+        )
+
+
+class TextCache:
+    """In-memory cache of rendered components shared by several models.
+
+    Keys are component file names with hashes of their content. Least
+    recently used texts are dropped once their total length exceeds
+    max_size characters. The cache can be used from several threads.
+    """
+
+    def __init__(self, max_size=DEFAULT_TEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self.__size = 0
+        self.__texts = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        with self.__lock:
+            text = self.__texts.get(key)
+
+            if text is not None:
+                self.__texts.move_to_end(key)
+
+            return text
+
+    def put(self, key, text):
+        with self.__lock:
+            old = self.__texts.pop(key, None)
+            if old is not None:
+                self.__size -= len(old)
+
+            self.__texts[key] = text
+            self.__size += len(text)
+
+            while self.__size > self.max_size:
+                _, old = self.__texts.popitem(last=False)
+                self.__size -= len(old)
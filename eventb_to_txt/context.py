@@ -2,10 +2,9 @@
 # Use of this source code is governed by the MIT license that can be
 # found in the LICENSE file.
 
-import os
-import xml.etree.ElementTree as ET
-
+from eventb_to_txt import text
 from eventb_to_txt.abstract import EventBComponent
+from eventb_to_txt.records import Axiom, Identifier
 
 
 class Context(EventBComponent):
@@ -14,22 +13,32 @@ class Context(EventBComponent):
     AXIOM = "org.eventb.core.axiom"
     CONSTANT = "org.eventb.core.constant"
 
-    def __init__(self, context):
+    def __init__(self, context, cache=None, fileobj=None):
         super().__init__(context)
         self.extends = []
         self.sets = []
         self.axioms = []
         self.constants = []
 
-        self.__parse()
+        self._load(self.__parse, cache, fileobj)
+
+    def get_dependencies(self):
+        return list(self.extends)
+
+    def _get_cache_entry(self):
+        return {"extends": self.extends}
+
+    def _set_cache_entry(self, entry):
+        self.extends = entry["extends"]
 
-    def __parse(self):
-        root = ET.parse(self.path).getroot()
+    def __parse(self, source):
+        elements = self.iter_elements(source)
+        root = next(elements)
 
         if self.COMMENT in root.attrib:
             self.head["comment"] = root.attrib[self.COMMENT]
 
-        for child in root:
+        for child in elements:
             tag = child.tag
             attrs = child.attrib
 
@@ -43,52 +52,31 @@ class Context(EventBComponent):
                 self.__parse_axiom(attrs)
 
     def __parse_set(self, attrs):
-        st = {"id": attrs[self.ID]}
-
-        if self.COMMENT in attrs:
-            st["comment"] = attrs[self.COMMENT]
-
-        self.sets.append(st)
+        self.sets.append(Identifier(attrs[self.ID], attrs.get(self.COMMENT)))
 
     def __parse_constant(self, attrs):
-        const = {"id": attrs[self.ID]}
-
-        if self.COMMENT in attrs:
-            const["comment"] = attrs[self.COMMENT]
-
-        self.constants.append(const)
+        self.constants.append(Identifier(attrs[self.ID], attrs.get(self.COMMENT)))
 
     def __parse_axiom(self, attrs):
-        axiom = {"label": attrs[self.LABEL], "predicate": attrs[self.PREDICATE]}
-
-        if self.THEOREM in attrs:
-            axiom["theorem"] = attrs[self.THEOREM]
-        if self.COMMENT in attrs:
-            axiom["comment"] = attrs[self.COMMENT]
-
-        self.axioms.append(axiom)
-
-    def __str__(self):
-        res = (
-            self.__to_str_context_head()
-            + self.__to_str_sets()
-            + self.__to_str_constants()
-            + self.__to_str_axioms()
-            + "end\n"
+        axiom = Axiom(
+            attrs[self.LABEL],
+            attrs[self.PREDICATE],
+            attrs.get(self.THEOREM),
+            attrs.get(self.COMMENT),
         )
-        return self._post_process_str(res)
 
-    def to_txt(self, out_path, merge=False):
-        exists = os.path.exists(out_path)
-
-        with open(out_path, "a", encoding="utf8") as f:
-            if merge and exists:
-                f.write("\n\n")
+        self.axioms.append(axiom)
 
-            f.write(str(self))
+    def _render(self):
+        yield self.__to_str_context_head()
+        yield from self.__render_sets()
+        yield from self.__render_constants()
+        yield from self.__render_axioms()
+        yield "end\n"
 
     def __to_str_context_head(self):
-        res = "context " + self.get_component_name() + self._to_str_comment(self.head)
+        res = "context " + self.get_component_name()
+        res += self._to_str_comment(self.head.get("comment"))
 
         if self.extends:
             res += self.TAB + "extends " + " ".join(self.extends) + "\n"
@@ -96,40 +84,41 @@ class Context(EventBComponent):
         res += "\n"
         return res
 
-    def __to_str_sets(self):
+    def __render_sets(self):
         if not self.sets:
-            return ""
+            return
 
-        pr_line = lambda x: self.TAB + x["id"] + self._to_str_comment(x)
-        return "sets\n" + "".join(map(pr_line, self.sets)) + "\n"
+        yield "sets\n"
+        for x in self.sets:
+            yield self.TAB + x.id + self._to_str_comment(x.comment)
+        yield "\n"
 
-    def __to_str_constants(self):
+    def __render_constants(self):
         if not self.constants:
-            return ""
+            return
 
-        pr_line = lambda x: self.TAB + x["id"] + self._to_str_comment(x)
-        return "constants\n" + "".join(map(pr_line, self.constants)) + "\n"
+        yield "constants\n"
+        for x in self.constants:
+            yield self.TAB + x.id + self._to_str_comment(x.comment)
+        yield "\n"
 
-    def __to_str_axioms(self):
+    def __render_axioms(self):
         if not self.axioms:
-            return ""
+            return
 
-        return (
-            "axioms\n"
-            + "".join(map(lambda x: self.__to_str_axiom(x), self.axioms))
-            + "\n"
-        )
+        yield "axioms\n"
+        for x in self.axioms:
+            yield self.__to_str_axiom(x)
+        yield "\n"
 
     def __to_str_axiom(self, axiom):
-        predicate = axiom["predicate"].replace("\r\n", "\n")
-        predicate = predicate.replace("\n", "\n" + self.TAB * 2)
-        predicate = predicate.replace("\t", self.TAB)
+        predicate = text.reindent(axiom.predicate, self.TAB_SIZE * 2)
 
         res = self.TAB
 
-        if "theorem" in axiom:
+        if axiom.theorem is not None:
             res += "theorem "
 
-        res += "@" + axiom["label"] + ":\n" + self.TAB * 2 + predicate
-        res += self._to_str_comment(axiom)
+        res += "@" + axiom.label + ":\n" + self.TAB * 2 + predicate
+        res += self._to_str_comment(axiom.comment)
         return res
@@ -0,0 +1,178 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Comparison of two versions of Event-B models.
+
+Component files are matched by their paths relative to the roots of the
+sources. Files with the same size and content hash are unchanged and are
+not parsed at all. Other ones are parsed and compared clause by clause,
+so changes of the XML formatting that do not change the model are
+ignored. Components are never rendered here: only changed and added ones
+need to be written by the caller.
+"""
+
+import hashlib
+import os
+import xml.etree.ElementTree as ET
+
+from eventb_to_txt.context import Context
+from eventb_to_txt.machine import Machine
+from eventb_to_txt.records import Event
+from eventb_to_txt.source import is_context_file
+
+# Size of chunks in which component files are hashed
+CHUNK_SIZE = 64 * 1024
+
+STATUSES = ("changed", "added", "removed")
+
+CONTEXT_CLAUSES = ("comment", "extends", "sets", "constants", "axioms")
+MACHINE_CLAUSES = ("comment", "refines", "sees", "variables", "invariants", "variant")
+EVENT_CLAUSES = tuple(x for x in Event.fields() if x != "label")
+
+
+class Change:
+    """Added, changed or removed component file.
+
+    Path is relative to the root of the sources, component is the parsed
+    new version (None if the component was removed), clauses describe
+    what has changed in a changed component.
+    """
+
+    __slots__ = ("path", "status", "component", "clauses")
+
+    def __init__(self, path, status, component=None, clauses=()):
+        self.path = path
+        self.status = status
+        self.component = component
+        self.clauses = list(clauses)
+
+    def __str__(self):
+        lines = ["{} {}".format(self.path, self.status)]
+        lines.extend("    " + x for x in self.clauses)
+        return "\n".join(lines)
+
+
+def compare(old_source, new_source):
+    """Return changes between component files of two sources.
+
+    Added and changed components go in the order of the new source,
+    removed ones follow in the order of the old source.
+    """
+    old_files = _find_component_files(old_source)
+    new_files = _find_component_files(new_source)
+    changes = []
+
+    for rel_path, path in new_files.items():
+        old_path = old_files.get(rel_path)
+
+        if old_path is None:
+            changes.append(Change(rel_path, "added", _load(new_source, path)))
+            continue
+
+        if _is_same_file(old_source, old_path, new_source, path):
+            continue
+
+        component = _load(new_source, path)
+        clauses = compare_components(_load(old_source, old_path), component)
+
+        if clauses:
+            changes.append(Change(rel_path, "changed", component, clauses))
+
+    for rel_path in old_files:
+        if rel_path not in new_files:
+            changes.append(Change(rel_path, "removed"))
+
+    return changes
+
+
+def compare_components(old, new):
+    """Return descriptions of changed clauses of two versions of a component."""
+    if isinstance(new, Machine):
+        clauses = MACHINE_CLAUSES
+    else:
+        clauses = CONTEXT_CLAUSES
+
+    res = [x for x in clauses if _get_clause(old, x) != _get_clause(new, x)]
+
+    if isinstance(new, Machine):
+        res.extend(_compare_events(old.events, new.events))
+
+    return res
+
+
+def _get_clause(component, name):
+    if name == "comment":
+        return component.head.get("comment")
+
+    return getattr(component, name)
+
+
+def _compare_events(old_events, new_events):
+    old_events = {x.label: x for x in old_events}
+    new_events = {x.label: x for x in new_events}
+    res = []
+
+    for label, event in new_events.items():
+        old = old_events.get(label)
+
+        if old is None:
+            res.append("event {} added".format(label))
+        elif event != old:
+            clauses = [x for x in EVENT_CLAUSES if getattr(event, x) != getattr(old, x)]
+            res.append("event {}: {}".format(label, ", ".join(clauses)))
+
+    res.extend("event {} removed".format(x) for x in old_events if x not in new_events)
+
+    # Events are printed in the order of the file
+    old_order = [x for x in old_events if x in new_events]
+    new_order = [x for x in new_events if x in old_events]
+
+    if old_order != new_order:
+        res.append("order of events")
+
+    return res
+
+
+def _find_component_files(source):
+    # Return {path relative to the root: path} of all component files
+    files = dict()
+
+    for model_path in source.find_model_paths():
+        context_files, machine_files = source.find_component_files(model_path)
+
+        for path in context_files + machine_files:
+            files.setdefault(os.path.relpath(path, source.root), path)
+
+    return files
+
+
+def _is_same_file(old_source, old_path, new_source, new_path):
+    if old_source.get_size(old_path) != new_source.get_size(new_path):
+        return False
+
+    return _get_digest(old_source, old_path) == _get_digest(new_source, new_path)
+
+
+def _get_digest(source, path):
+    h = hashlib.sha256()
+
+    with source.open(path) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+
+    return h.digest()
+
+
+def _load(source, path):
+    # Components are not taken from the cache, their clauses are compared
+    try:
+        with source.open(path) as f:
+            if is_context_file(path):
+                return Context(path, fileobj=f)
+
+            return Machine(path, fileobj=f)
+    except KeyError as e:
+        raise RuntimeError("{}: Missing attribute {}".format(path, e))
+    except (ET.ParseError, ValueError) as e:
+        raise RuntimeError("{}: {}: {}".format(path, type(e).__name__, e))
@@ -0,0 +1,103 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+
+class DependencyGraph:
+    """Refines, sees and extends relations between components of a model.
+
+    Components must provide get_component_name() and get_dependencies().
+    Dependencies are referenced by name; if several components share a
+    name, the first one is used.
+    """
+
+    def __init__(self, components):
+        self.components = list(components)
+        self.index = dict()
+
+        for component in self.components:
+            self.index.setdefault(component.get_component_name(), component)
+
+        self.__order = None
+
+    def get(self, name):
+        try:
+            return self.index[name]
+        except KeyError:
+            raise RuntimeError("Cant find object by name '{}'".format(name))
+
+    def get_dependencies(self, component):
+        return [self.get(name) for name in component.get_dependencies()]
+
+    def leaves(self):
+        # Find model components that are not extended or refined
+        referenced = set()
+
+        for component in self.components:
+            referenced.update(component.get_dependencies())
+
+        leaves = [
+            x for x in self.components if x.get_component_name() not in referenced
+        ]
+        leaves.sort(key=lambda x: x.get_component_name(), reverse=True)
+
+        return leaves
+
+    def order(self):
+        """Return components in the merge order: each one after its ancestors."""
+        if self.__order is None:
+            order = self.sort(self.leaves())
+
+            # Components of a cycle that no leaf reaches are sorted on
+            # their own, so that the cycle is reported
+            done = set(order)
+            rest = [x for x in self.index.values() if x not in done]
+            order += self.sort(rest)
+
+            self.__order = order
+
+        return self.__order
+
+    def sort(self, roots):
+        """Return roots and their ancestors, each one after its dependencies.
+
+        Dependencies are visited in the depth-first order: a refined machine
+        goes before the seen contexts, extended contexts go in the order in
+        which they are listed.
+        """
+        order = []
+        done = set()
+
+        for root in roots:
+            if root in done:
+                continue
+
+            stack = [(root, iter(self.get_dependencies(root)))]
+            active = {root}
+
+            while stack:
+                component, dependencies = stack[-1]
+
+                for dependency in dependencies:
+                    if dependency in done:
+                        continue
+
+                    if dependency in active:
+                        names = [x.get_component_name() for x, _ in stack]
+                        names = names[names.index(dependency.get_component_name()) :]
+                        names.append(dependency.get_component_name())
+
+                        raise RuntimeError(
+                            "Cyclic dependency: {}".format(" -> ".join(names))
+                        )
+
+                    active.add(dependency)
+                    stack.append((dependency, iter(self.get_dependencies(dependency))))
+                    break
+                else:
+                    stack.pop()
+                    active.discard(component)
+                    done.add(component)
+                    order.append(component)
+
+        return order
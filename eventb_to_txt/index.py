@@ -0,0 +1,151 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Dependency graph of a model stored next to its component files.
+
+The index is a JSON file in the model directory:
+
+    {
+      "version": 1,
+      "components": [
+        {"name": "M1", "path": "M1.bum", "size": 1024, "mtime_ns": ...,
+         "refines": "M0", "sees": ["C1"], "extends": []},
+        ...
+      ],
+      "order": ["C0.buc", "C1.buc", "M0.bum", "M1.bum"]
+    }
+
+Paths are relative to the model directory, order is the merge order. The
+index is valid while the model has the same files with the same size and
+modification time, so it is checked with stat calls only. It can also be
+queried by other tools without parsing component files:
+
+    index = Index.load("path/to/model")
+    index.find(sees="C3")
+"""
+
+import json
+import os
+
+from eventb_to_txt.graph import DependencyGraph
+from eventb_to_txt.output import AtomicFile
+from eventb_to_txt.scanner import Header
+
+# Starts with a dot, so it is not mistaken for a model file
+INDEX_NAME = ".eventb-to-txt-index.json"
+VERSION = 1
+
+
+class Index:
+    def __init__(self, model_path, components, order):
+        self.model_path = os.path.abspath(model_path)
+        self.components = components
+        self.order = order
+
+    @staticmethod
+    def get_path(model_path):
+        return os.path.join(model_path, INDEX_NAME)
+
+    @classmethod
+    def load(cls, model_path):
+        """Return the index of the model, or None if there is no valid one."""
+        try:
+            with open(cls.get_path(model_path), encoding="utf8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(data, dict) or data.get("version") != VERSION:
+            return None
+
+        return cls(model_path, data["components"], data["order"])
+
+    @classmethod
+    def build(cls, model_path, components, stamps):
+        """Make the index of components of the model.
+
+        Components are parsed ones or scanned headers, stamps map their
+        paths to (mtime_ns, size) values taken before they were read.
+        """
+        model_path = os.path.abspath(model_path)
+        entries = []
+
+        for c in components:
+            mtime_ns, size = stamps[c.path]
+            entries.append(
+                {
+                    "name": c.get_component_name(),
+                    "path": os.path.relpath(c.path, model_path),
+                    "size": size,
+                    "mtime_ns": mtime_ns,
+                    "refines": getattr(c, "refines", ""),
+                    "sees": list(getattr(c, "sees", [])),
+                    "extends": list(getattr(c, "extends", [])),
+                }
+            )
+
+        order = DependencyGraph(components).order()
+        return cls(
+            model_path, entries, [os.path.relpath(x.path, model_path) for x in order]
+        )
+
+    def save(self):
+        data = {"version": VERSION, "components": self.components, "order": self.order}
+
+        with AtomicFile(self.get_path(self.model_path), skip_unchanged=True) as f:
+            json.dump(data, f, indent=2)
+            f.write("\n")
+
+    def get_paths(self):
+        return [os.path.join(self.model_path, x["path"]) for x in self.components]
+
+    def get_order(self):
+        """Return paths of components in the merge order."""
+        return [os.path.join(self.model_path, x) for x in self.order]
+
+    def is_valid(self, paths):
+        """Check that paths are exactly the indexed and unchanged files."""
+        if sorted(paths) != sorted(self.get_paths()):
+            return False
+
+        for path, entry in zip(self.get_paths(), self.components):
+            try:
+                st = os.stat(path)
+            except OSError:
+                return False
+
+            if (st.st_mtime_ns, st.st_size) != (entry["mtime_ns"], entry["size"]):
+                return False
+
+        return True
+
+    def find(self, refines=None, sees=None, extends=None):
+        """Return names of components which refine, see or extend the given ones."""
+        res = []
+
+        for x in self.components:
+            if refines is not None and x["refines"] != refines:
+                continue
+            if sees is not None and sees not in x["sees"]:
+                continue
+            if extends is not None and extends not in x["extends"]:
+                continue
+
+            res.append(x["name"])
+
+        return res
+
+    def closure(self, name):
+        """Return paths of the component and of all its ancestors."""
+        headers = []
+
+        for path, entry in zip(self.get_paths(), self.components):
+            header = Header(path)
+            header.refines = entry["refines"]
+            header.sees = entry["sees"]
+            header.extends = entry["extends"]
+            headers.append(header)
+
+        graph = DependencyGraph(headers)
+        return [x.path for x in graph.sort([graph.get(name)])]
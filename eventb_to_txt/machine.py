@@ -2,10 +2,17 @@
 # Use of this source code is governed by the MIT license that can be
 # found in the LICENSE file.
 
-import os
-import xml.etree.ElementTree as ET
-
+from eventb_to_txt import text
 from eventb_to_txt.abstract import EventBComponent
+from eventb_to_txt.records import (
+    Action,
+    Event,
+    Guard,
+    Identifier,
+    Invariant,
+    Variant,
+    Witness,
+)
 
 
 class Machine(EventBComponent):
@@ -25,24 +32,36 @@ class Machine(EventBComponent):
     REFINES_EVENT = "org.eventb.core.refinesEvent"
     WITNESS = "org.eventb.core.witness"
 
-    def __init__(self, machine):
+    def __init__(self, machine, cache=None, fileobj=None):
         super().__init__(machine)
         self.sees = []
         self.refines = ""
         self.variables = []
         self.invariants = []
-        self.variant = dict()
+        self.variant = None
         self.events = []
 
-        self.__parse()
+        self._load(self.__parse, cache, fileobj)
+
+    def get_dependencies(self):
+        dependencies = [self.refines] if self.refines else []
+        return dependencies + self.sees
+
+    def _get_cache_entry(self):
+        return {"refines": self.refines, "sees": self.sees}
 
-    def __parse(self):
-        root = ET.parse(self.path).getroot()
+    def _set_cache_entry(self, entry):
+        self.refines = entry["refines"]
+        self.sees = entry["sees"]
+
+    def __parse(self, source):
+        elements = self.iter_elements(source)
+        root = next(elements)
 
         if self.COMMENT in root.attrib:
             self.head["comment"] = root.attrib[self.COMMENT]
 
-        for child in root:
+        for child in elements:
             tag = child.tag
             attrs = child.attrib
 
@@ -66,38 +85,28 @@ class Machine(EventBComponent):
         self.sees.append(attrs[self.TARGET])
 
     def __parse_variable(self, attrs):
-        var = {"id": attrs[self.ID]}
-
-        if self.COMMENT in attrs:
-            var["comment"] = attrs[self.COMMENT]
-
-        self.variables.append(var)
+        self.variables.append(Identifier(attrs[self.ID], attrs.get(self.COMMENT)))
 
     def __parse_invariant(self, attrs):
-        inv = {"label": attrs[self.LABEL], "predicate": attrs[self.PREDICATE]}
-
-        if self.THEOREM in attrs:
-            inv["theorem"] = attrs[self.THEOREM]
-        if self.COMMENT in attrs:
-            inv["comment"] = attrs[self.COMMENT]
+        inv = Invariant(
+            attrs[self.LABEL],
+            attrs[self.PREDICATE],
+            attrs.get(self.THEOREM),
+            attrs.get(self.COMMENT),
+        )
 
         self.invariants.append(inv)
 
     def __parse_variant(self, attrs):
-        self.variant["expression"] = attrs[self.EXPRESSION]
-
-        if self.COMMENT in attrs:
-            self.variant["comment"] = attrs[self.COMMENT]
+        self.variant = Variant(attrs[self.EXPRESSION], attrs.get(self.COMMENT))
 
     def __parse_event(self, attrs, child):
-        event = {
-            "label": attrs[self.LABEL],
-            "convergence": attrs[self.CONVERGENCE],
-            "extended": attrs[self.EXTENDED],
-        }
-
-        if self.COMMENT in attrs:
-            event["comment"] = attrs[self.COMMENT]
+        event = Event(
+            attrs[self.LABEL],
+            attrs[self.CONVERGENCE],
+            attrs[self.EXTENDED],
+            attrs.get(self.COMMENT),
+        )
 
         for grandchild in child:
             grand_tag = grandchild.tag
@@ -117,76 +126,60 @@ class Machine(EventBComponent):
         self.events.append(event)
 
     def __parse_refines(self, event, attrs):
-        event["refines"] = attrs[self.TARGET]
+        event.refines = attrs[self.TARGET]
 
     def __parse_parameter(self, event, attrs):
-        parameter = {"id": attrs[self.ID]}
-
-        if self.COMMENT in attrs:
-            parameter["comment"] = attrs[self.COMMENT]
+        parameter = Identifier(attrs[self.ID], attrs.get(self.COMMENT))
 
-        if "parameters" not in event:
-            event["parameters"] = []
+        if not event.parameters:
+            event.parameters = []
 
-        event["parameters"].append(parameter)
+        event.parameters.append(parameter)
 
     def __parse_guard(self, event, attrs):
-        guard = {"label": attrs[self.LABEL], "predicate": attrs[self.PREDICATE]}
-
-        if self.THEOREM in attrs:
-            guard["theorem"] = attrs[self.THEOREM]
-        if self.COMMENT in attrs:
-            guard["comment"] = attrs[self.COMMENT]
+        guard = Guard(
+            attrs[self.LABEL],
+            attrs[self.PREDICATE],
+            attrs.get(self.THEOREM),
+            attrs.get(self.COMMENT),
+        )
 
-        if "guards" not in event:
-            event["guards"] = []
+        if not event.guards:
+            event.guards = []
 
-        event["guards"].append(guard)
+        event.guards.append(guard)
 
     def __parse_witness(self, event, attrs):
-        witness = {"label": attrs[self.LABEL], "predicate": attrs[self.PREDICATE]}
-
-        if self.COMMENT in attrs:
-            witness["comment"] = attrs[self.COMMENT]
+        witness = Witness(
+            attrs[self.LABEL], attrs[self.PREDICATE], attrs.get(self.COMMENT)
+        )
 
-        if "witnesses" not in event:
-            event["witnesses"] = []
+        if not event.witnesses:
+            event.witnesses = []
 
-        event["witnesses"].append(witness)
+        event.witnesses.append(witness)
 
     def __parse_action(self, event, attrs):
-        action = {"label": attrs[self.LABEL], "assignment": attrs[self.ASSIGNMENT]}
-
-        if self.COMMENT in attrs:
-            action["comment"] = attrs[self.COMMENT]
-
-        if "actions" not in event:
-            event["actions"] = []
-
-        event["actions"].append(action)
-
-    def __str__(self):
-        res = (
-            self.__to_str_machine_head()
-            + self.__to_str_variables()
-            + self.__to_str_invariants()
-            + self.__to_str_variant()
-            + self.__to_str_events()
-            + "end\n"
+        action = Action(
+            attrs[self.LABEL], attrs[self.ASSIGNMENT], attrs.get(self.COMMENT)
         )
-        return self._post_process_str(res)
 
-    def to_txt(self, out_path, merge=False):
-        exists = os.path.exists(out_path)
+        if not event.actions:
+            event.actions = []
 
-        with open(out_path, "a", encoding="utf8") as f:
-            if merge and exists:
-                f.write("\n\n")
+        event.actions.append(action)
 
-            f.write(str(self))
+    def _render(self):
+        yield self.__to_str_machine_head()
+        yield from self.__render_variables()
+        yield from self.__render_invariants()
+        yield self.__to_str_variant()
+        yield from self.__render_events()
+        yield "end\n"
 
     def __to_str_machine_head(self):
-        res = "machine " + self.get_component_name() + self._to_str_comment(self.head)
+        res = "machine " + self.get_component_name()
+        res += self._to_str_comment(self.head.get("comment"))
 
         if self.refines:
             res += self.TAB + "refines " + self.refines + "\n"
@@ -197,35 +190,34 @@ class Machine(EventBComponent):
         res += "\n"
         return res
 
-    def __to_str_variables(self):
+    def __render_variables(self):
         if not self.variables:
-            return ""
+            return
 
-        pr_line = lambda x: self.TAB + x["id"] + self._to_str_comment(x)
-        return "variables\n" + "".join(map(pr_line, self.variables)) + "\n"
+        yield "variables\n"
+        for x in self.variables:
+            yield self.TAB + x.id + self._to_str_comment(x.comment)
+        yield "\n"
 
-    def __to_str_invariants(self):
+    def __render_invariants(self):
         if not self.invariants:
-            return ""
+            return
 
-        return (
-            "invariants\n"
-            + "".join(map(lambda x: self.__to_str_invariant(x), self.invariants))
-            + "\n"
-        )
+        yield "invariants\n"
+        for x in self.invariants:
+            yield self.__to_str_invariant(x)
+        yield "\n"
 
     def __to_str_invariant(self, inv):
-        predicate = inv["predicate"].replace("\r\n", "\n")
-        predicate = predicate.replace("\n", "\n" + self.TAB * 2)
-        predicate = predicate.replace("\t", self.TAB)
+        predicate = text.reindent(inv.predicate, self.TAB_SIZE * 2)
 
         res = self.TAB
 
-        if "theorem" in inv:
+        if inv.theorem is not None:
             res += "theorem "
 
-        res += "@" + inv["label"] + ":\n" + self.TAB * 2 + predicate
-        res += self._to_str_comment(inv)
+        res += "@" + inv.label + ":\n" + self.TAB * 2 + predicate
+        res += self._to_str_comment(inv.comment)
         return res
 
     def __to_str_variant(self):
@@ -235,130 +227,99 @@ class Machine(EventBComponent):
         return (
             "variant\n"
             + self.TAB
-            + self.variant["expression"]
-            + self._to_str_comment(self.variant)
+            + self.variant.expression
+            + self._to_str_comment(self.variant.comment)
             + "\n"
         )
 
-    def __to_str_events(self):
+    def __render_events(self):
         if not self.events:
-            return ""
+            return
 
-        return "events\n" + "".join(map(lambda x: self.__to_str_event(x), self.events))
-
-    def __to_str_event(self, event):
-        res = self.__to_str_event_head(event)
-
-        if "parameters" in event:
-            res += (
-                self.TAB
-                + self.HALFTAB
-                + "any\n"
-                + "".join(
-                    map(
-                        lambda x: self.TAB * 2 + x["id"] + self._to_str_comment(x),
-                        event["parameters"],
-                    )
-                )
-            )
-
-        if "guards" in event:
-            res += (
-                self.TAB
-                + self.HALFTAB
-                + "where\n"
-                + "".join(map(lambda x: self.__to_str_guard(x), event["guards"]))
-            )
-
-        if "witnesses" in event:
-            res += (
-                self.TAB
-                + self.HALFTAB
-                + "with\n"
-                + "".join(map(lambda x: self.__to_str_witness(x), event["witnesses"]))
-            )
-
-        if "actions" in event:
-            res += (
-                self.TAB
-                + self.HALFTAB
-                + "then\n"
-                + "".join(map(lambda x: self.__to_str_action(x), event["actions"]))
-            )
-
-        res += self.TAB + "end\n\n"
-        return res
+        yield "events\n"
+        for event in self.events:
+            yield from self.__render_event(event)
+
+    def __render_event(self, event):
+        yield self.__to_str_event_head(event)
+
+        if event.parameters:
+            yield self.TAB + self.HALFTAB + "any\n"
+            for x in event.parameters:
+                yield self.TAB * 2 + x.id + self._to_str_comment(x.comment)
+
+        if event.guards:
+            yield self.TAB + self.HALFTAB + "where\n"
+            for x in event.guards:
+                yield self.__to_str_guard(x)
+
+        if event.witnesses:
+            yield self.TAB + self.HALFTAB + "with\n"
+            for x in event.witnesses:
+                yield self.__to_str_witness(x)
+
+        if event.actions:
+            yield self.TAB + self.HALFTAB + "then\n"
+            for x in event.actions:
+                yield self.__to_str_action(x)
+
+        yield self.TAB + "end\n\n"
 
     def __to_str_event_head(self, event):
         res = self.TAB
 
-        if event["convergence"] == "1":
+        if event.convergence == "1":
             res += "convergent "
-        elif event["convergence"] == "2":
+        elif event.convergence == "2":
             res += "anticipated "
 
-        res += "event " + event["label"]
+        res += "event " + event.label
 
-        if "refines" in event:
-            if event["extended"] == "true":
-                res += " extends " + event["refines"]
+        if event.refines is not None:
+            if event.extended == "true":
+                res += " extends " + event.refines
             else:
-                res += " refines " + event["refines"]
+                res += " refines " + event.refines
         else:
-            if event["extended"] == "true":
-                res += " extends " + event["label"]
+            if event.extended == "true":
+                res += " extends " + event.label
 
-        res += self._to_str_comment(event)
+        res += self._to_str_comment(event.comment)
         return res
 
     def __to_str_guard(self, guard):
         res = self.TAB * 2
 
-        if "theorem" in guard:
+        if guard.theorem is not None:
             res += "theorem "
 
-        res += "@" + guard["label"] + ": "
+        res += "@" + guard.label + ": "
 
-        additional_tab = len(guard["label"]) + 2
-        if "theorem" in guard:
+        additional_tab = len(guard.label) + 2
+        if guard.theorem is not None:
             additional_tab += len("theorem ")
 
-        replacement = "\n" + self.TAB * 2 + " " * additional_tab
-        predicate = guard["predicate"].replace("\r\n", "\n")
-        predicate = predicate.replace("\n", replacement)
-        predicate = predicate.replace("\t", self.TAB)
-
-        res += predicate
+        res += text.reindent(guard.predicate, self.TAB_SIZE * 2 + additional_tab)
 
-        res += self._to_str_comment(guard)
+        res += self._to_str_comment(guard.comment)
         return res
 
     def __to_str_witness(self, witness):
-        res = self.TAB * 2 + "@" + witness["label"] + ": "
+        res = self.TAB * 2 + "@" + witness.label + ": "
 
-        additional_tab = len(witness["label"]) + 2
+        additional_tab = len(witness.label) + 2
 
-        replacement = "\n" + self.TAB * 2 + " " * additional_tab
-        predicate = witness["predicate"].replace("\r\n", "\n")
-        predicate = predicate.replace("\n", replacement)
-        predicate = predicate.replace("\t", self.TAB)
+        res += text.reindent(witness.predicate, self.TAB_SIZE * 2 + additional_tab)
 
-        res += predicate
-
-        res += self._to_str_comment(witness)
+        res += self._to_str_comment(witness.comment)
         return res
 
     def __to_str_action(self, action):
-        res = self.TAB * 2 + "@" + action["label"] + ": "
-
-        additional_tab = len(action["label"]) + 2
+        res = self.TAB * 2 + "@" + action.label + ": "
 
-        replacement = "\n" + self.TAB * 2 + " " * additional_tab
-        assignment = action["assignment"].replace("\r\n", "\n")
-        assignment = assignment.replace("\n", replacement)
-        assignment = assignment.replace("\t", self.TAB)
+        additional_tab = len(action.label) + 2
 
-        res += assignment
+        res += text.reindent(action.assignment, self.TAB_SIZE * 2 + additional_tab)
 
-        res += self._to_str_comment(action)
+        res += self._to_str_comment(action.comment)
         return res
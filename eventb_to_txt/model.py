@@ -2,176 +2,528 @@
 # Use of this source code is governed by the MIT license that can be
 # found in the LICENSE file.
 
-import collections
-import glob
+import hashlib
+import io
 import os
+import xml.etree.ElementTree as ET
+from xml.parsers.expat import ExpatError
 
+from eventb_to_txt import stats
 from eventb_to_txt.context import Context
+from eventb_to_txt.graph import DependencyGraph
+from eventb_to_txt.index import Index
 from eventb_to_txt.machine import Machine
+from eventb_to_txt.output import write_txt
+from eventb_to_txt.scanner import Header, scan_header
+from eventb_to_txt.source import DirectorySource, NO_MODELS, is_context_file
 
+# Size of chunks in which changed component files are hashed
+CHUNK_SIZE = 64 * 1024
 
-class Model:
-    def __init__(self, model_path):
-        context_files = []
-        machine_files = []
-
-        if os.path.isdir(model_path):
-            context_files = self.__find_context_files(model_path)
-            machine_files = self.__find_machine_files(model_path)
-        elif os.path.isfile(model_path):
-            if model_path.endswith(".buc"):
-                context_files = [model_path]
-            elif model_path.endswith(".bum"):
-                machine_files = [model_path]
-
-        if not context_files and not machine_files:
-            raise RuntimeError(
-                "It seems that the specified directory does not contain any Event-B models"
-            )
 
-        self.model_objs = self.__parse_model(context_files, machine_files)
+class Model:
+    def __init__(
+        self,
+        model_path,
+        cache=None,
+        source=None,
+        component=None,
+        index=False,
+        texts=None,
+    ):
+        """Find components of the model.
+
+        Components are parsed lazily, when they are first needed. If a
+        component file can't be parsed, the error is stored in errors,
+        and txt files that would contain the component are not written;
+        the rest of the model is converted as usual.
+
+        If component is given, only this component and its refined, seen
+        and extended ancestors are converted; they are found by scanning
+        headers of the component files.
+
+        If index is True, the dependency graph of a model directory is
+        stored to its index file. While the index is valid, the graph is
+        taken from it instead of being computed again.
+
+        Texts is a TextCache shared by several models, so that components
+        with byte-identical files are rendered once for all of them. It is
+        filled by render(); print() and write_to() use the texts found in
+        it and stream other components.
+        """
+        if source is None:
+            source = DirectorySource(model_path)
+
+        self.model_path = model_path
+        # Component file path -> error message
+        self.errors = dict()
+        self.__cache = cache
+        self.__texts = texts
+        self.__source = source
+        self.__component = component
+        self.__use_index = (
+            index and isinstance(source, DirectorySource) and os.path.isdir(model_path)
+        )
+        self.__index = None
+        # Component file path -> (source.stat() value, content hash or None)
+        self.__stamps = dict()
+        # Component file path -> (source.stat() value, scanned header,
+        # error message or None)
+        self.__headers = dict()
+        # Paths of the component and its ancestors, whose scan errors
+        # are reported
+        self.__closure = set()
+        # Component file path -> parsed component
+        self.__objs = dict()
+        # Component file path -> header of the parsed component, which is
+        # kept when the component itself is released
+        self.__deps = dict()
+        self.__graph = None
+
+        context_files, machine_files = self.__find_component_files()
+        self.__files = context_files + machine_files
+        self.__names = dict()
+        for path in self.__files:
+            self.__names.setdefault(self.__get_name(path), path)
 
     @staticmethod
     def find_model_paths(in_path):
-        model_paths = set()
+        return DirectorySource(in_path).find_model_paths()
 
-        if os.path.isdir(in_path):
-            for path in Model.__find_context_files(in_path):
-                model_paths.add(os.path.dirname(path))
-
-            for path in Model.__find_machine_files(in_path):
-                model_paths.add(os.path.dirname(path))
-        elif os.path.isfile(in_path):
-            if in_path.endswith(".buc") or in_path.endswith(".bum"):
-                model_paths.add(in_path)
+    @staticmethod
+    def filter_model_paths(model_paths, component, source):
+        """Return paths of models which have the component."""
+        res = [x for x in model_paths if Model.contains(x, component, source)]
 
-        if not model_paths:
-            raise RuntimeError(
-                "It seems that the specified directory does not contain any Event-B models"
-            )
+        if not res:
+            raise RuntimeError("Can't find component {!r}".format(component))
 
-        model_paths = [os.path.abspath(p) for p in model_paths]
-        return model_paths
+        return res
 
     @staticmethod
-    def __find_context_files(path):
-        return glob.glob(
-            os.path.abspath(os.path.join(path, "**/*.buc")), recursive=True
+    def contains(model_path, component, source=None):
+        """Check whether the model has a component with the given name."""
+        if source is None:
+            source = DirectorySource(model_path)
+
+        context_files, machine_files = source.find_component_files(model_path)
+
+        return any(
+            Model.__get_name(x) == component for x in context_files + machine_files
         )
 
     @staticmethod
-    def __find_machine_files(path):
-        return glob.glob(
-            os.path.abspath(os.path.join(path, "**/*.bum")), recursive=True
+    def __get_name(path):
+        return os.path.basename(os.path.splitext(path)[0])
+
+    def __find_component_files(self):
+        context_files, machine_files = self.__source.find_component_files(
+            self.model_path
         )
 
-    def __parse_model(self, context_files, machine_files):
-        model_objs = []
+        if not context_files and not machine_files:
+            raise RuntimeError(NO_MODELS)
 
-        for context_file in context_files:
-            c = Context(context_file)
-            model_objs.append(c)
+        files = context_files + machine_files
 
-        for machine_file in machine_files:
-            m = Machine(machine_file)
-            model_objs.append(m)
+        if self.__use_index:
+            with stats.phase("index"):
+                self.__index = Index.load(self.model_path)
 
-        return model_objs
+                if self.__index is not None and not self.__index.is_valid(files):
+                    self.__index = None
 
-    def __search_obj_by_name(self, name):
-        for obj in self.model_objs:
-            if obj.get_component_name() == name:
-                return obj
+        if self.__component is not None:
+            if self.__index is not None:
+                closure = set(self.__index.closure(self.__component))
+            else:
+                closure = self.__find_closure(files)
 
-        raise RuntimeError("Cant find object by name '{}'".format(name))
+            context_files = [x for x in context_files if x in closure]
+            machine_files = [x for x in machine_files if x in closure]
 
-    def __get_context_print_queue(self, context):
-        queue = []
+        return context_files, machine_files
 
-        for extended in context.extends:
-            queue.extend(
-                self.__get_context_print_queue(self.__search_obj_by_name(extended))
-            )
+    def __find_closure(self, files):
+        headers = dict()
 
-        queue.append(context)
+        for path in files:
+            stamp = self.__source.stat(path)
+            old = self.__headers.get(path)
 
-        return queue
+            if old is not None and old[0] == stamp:
+                headers[path] = old
+                continue
 
-    def __get_machine_print_queue(self, machine):
-        queue = []
+            # Files that can't be scanned have no dependencies
+            try:
+                with stats.phase("scan", path), self.__source.open(path) as f:
+                    headers[path] = (stamp, scan_header(path, f), None)
+            except (ExpatError, KeyError, OSError) as e:
+                headers[path] = (stamp, Header(path), self.__format_error(e))
 
-        if machine.refines:
-            refines_obj = self.__search_obj_by_name(machine.refines)
-            queue.extend(self.__get_machine_print_queue(refines_obj))
+        # Errors of files that are fixed or removed are dropped
+        for path, (_, _, error) in self.__headers.items():
+            if error is not None and self.errors.get(path) == error:
+                del self.errors[path]
 
-        for context in machine.sees:
-            context_obj = self.__search_obj_by_name(context)
-            queue.extend(self.__get_context_print_queue(context_obj))
+        graph = DependencyGraph([x for _, x, _ in headers.values()])
+        self.__headers = headers
+        self.__closure = {x.path for x in graph.sort([graph.get(self.__component)])}
+        self.__add_scan_errors()
 
-        queue.append(machine)
+        return self.__closure
 
-        return queue
+    def __update_index(self):
+        # Graph of all component files is known after they are parsed,
+        # or after their headers are scanned if a component was given
+        if not self.__use_index or self.__index is not None:
+            return
 
-    def __get_obj_print_queue(self, obj):
-        if type(obj) is Machine:
-            return self.__get_machine_print_queue(obj)
-        elif type(obj) is Context:
-            return self.__get_context_print_queue(obj)
+        if self.__component is not None:
+            if any(x is not None for _, _, x in self.__headers.values()):
+                return
 
-    def __find_leaves(self):
-        # Find model components that are not extended or refined
-        leaves = []
+            headers = [x for _, x, _ in self.__headers.values()]
+            stamps = {path: x for path, (x, _, _) in self.__headers.items()}
+        elif self.errors or len(self.__deps) < len(self.__files):
+            return
+        else:
+            headers = [self.__deps[x] for x in self.__files]
+            stamps = {x: self.__stamps[x][0] for x in self.__files}
 
-        for obj in self.model_objs:
-            if type(obj) is Machine:
-                if obj.refines:
-                    leaves.append(obj.refines)
+        try:
+            index = Index.build(self.model_path, headers, stamps)
+        except RuntimeError:
+            # Broken graph is reported when the model is printed
+            return
 
-                leaves.extend(obj.sees)
+        try:
+            index.save()
+        except OSError:
+            pass
 
-            if type(obj) is Context:
-                leaves.extend(obj.extends)
+        self.__index = index
 
-        leaves = [x for x in self.model_objs if x.get_component_name() not in leaves]
-        leaves.sort(key=lambda x: x.head["name"], reverse=True)
+    def __load(self, path):
+        # Stat is taken before reading, so a file changed in between
+        # is parsed again on the next refresh
+        stamp = self.__source.stat(path)
 
-        return leaves
+        try:
+            with stats.phase("parse", path), self.__source.open(path) as f:
+                reader = _HashingReader(f)
 
-    def __get_print_queue(self):
-        leaves = self.__find_leaves()
+                if is_context_file(path):
+                    obj = Context(path, self.__cache, reader)
+                else:
+                    obj = Machine(path, self.__cache, reader)
+        except BaseException:
+            self.__stamps[path] = (stamp, None)
+            raise
+
+        self.__stamps[path] = (stamp, reader.digest())
+        return obj
+
+    def __get(self, path):
+        # Return the parsed component, or None if it can't be parsed
+        obj = self.__objs.get(path)
+
+        if obj is None and path not in self.errors:
+            try:
+                obj = self.__load(path)
+            except (ET.ParseError, KeyError, ValueError, OSError) as e:
+                self.errors[path] = self.__format_error(e)
+                return None
 
-        queue = []
+            self.__objs[path] = obj
+            self.__deps[path] = Header.from_component(obj)
 
-        for leaf in leaves:
-            leaf_queue = self.__get_obj_print_queue(leaf)
-            queue.extend([x for x in leaf_queue if x not in queue])
+        return obj
 
-        # Remove duplicate entries from the queue
-        return list(collections.OrderedDict.fromkeys(queue))
+    @staticmethod
+    def __format_error(e):
+        if isinstance(e, KeyError):
+            return "Missing attribute {}".format(e)
+
+        return "{}: {}".format(type(e).__name__, e)
+
+    def __add_scan_errors(self):
+        # Files that are not converted are not reported
+        for path, (_, _, error) in self.__headers.items():
+            if error is not None and path in self.__closure:
+                self.errors[path] = error
+
+    def get(self, name):
+        """Return the component with the given name, parsing it if needed."""
+        try:
+            path = self.__names[name]
+        except KeyError:
+            raise RuntimeError("Cant find object by name '{}'".format(name))
+
+        obj = self.__get(path)
+
+        if obj is None:
+            raise RuntimeError("{}: {}".format(path, self.errors[path]))
+
+        return obj
+
+    @property
+    def model_objs(self):
+        """Parsed components of the model, in the order of their files."""
+        objs = [self.__get(x) for x in self.__files]
+        return [x for x in objs if x is not None]
+
+    def __is_unchanged(self, path):
+        if path not in self.__stamps:
+            return False
+
+        stamp, digest = self.__stamps[path]
+        new_stamp = self.__source.stat(path)
+
+        if new_stamp == stamp:
+            return True
+
+        with self.__source.open(path) as f:
+            reader = _HashingReader(f)
+            while reader.read(CHUNK_SIZE):
+                pass
+
+        if reader.digest() != digest:
+            return False
+
+        self.__stamps[path] = (new_stamp, digest)
+        return True
+
+    def refresh(self):
+        """Forget components which files changed since they were parsed.
+
+        Files are compared by modification time and size, and by content
+        hash if those differ. New files of the model are found, removed
+        ones are dropped, changed ones are parsed again when they are
+        needed. Return paths of added, changed and removed components.
+        """
+        context_files, machine_files = self.__find_component_files()
+        files = context_files + machine_files
+        old_files = set(self.__files)
+        # Components that were never parsed will be parsed from new files
+        changed = [
+            x
+            for x in files
+            if x not in old_files or (x in self.__stamps and not self.__is_unchanged(x))
+        ]
+        removed = [x for x in self.__files if x not in set(files)]
+
+        for path in changed + removed:
+            self.__objs.pop(path, None)
+            self.__deps.pop(path, None)
+            self.errors.pop(path, None)
+
+        for path in removed:
+            self.__stamps.pop(path, None)
+
+        self.__add_scan_errors()
+
+        self.__files = files
+        self.__names = dict()
+        for path in files:
+            self.__names.setdefault(self.__get_name(path), path)
+
+        changed.extend(removed)
+
+        if changed:
+            self.__graph = None
+
+        return changed
+
+    @property
+    def graph(self):
+        """Dependency graph of headers of all components of the model."""
+        if self.__graph is None:
+            # Components that can't be parsed have unknown dependencies
+            headers = [
+                self.__deps[x] if self.__get(x) is not None else Header(x)
+                for x in self.__files
+            ]
+            self.__graph = DependencyGraph(headers)
+
+        return self.__graph
+
+    def __get_print_queue(self):
+        with stats.phase("ordering"):
+            if self.__index is not None and self.__component is None:
+                return self.__index.get_order()
 
-    def print(self, out_path, merge):
-        txt_hash = dict()
+            return [x.path for x in self.graph.order()]
 
+    def __get_output(self, merge, changed=None, stdout=False):
+        # Return (txt file name, component file paths) pairs in the output
+        # order; for stdout, components are not grouped across txt files
         if merge:
             queue = self.__get_print_queue()
         else:
-            queue = self.model_objs
+            queue = self.__files
 
-        if out_path == "-":
-            for el in queue:
-                print(el, end="")
-            return
+        if changed is not None:
+            affected = {self.__get_txt_name(x, merge) for x in changed}
+            queue = [x for x in queue if self.__get_txt_name(x, merge) in affected]
+
+        output = []
+        files = dict()
+
+        for path in queue:
+            txt_name = self.__get_txt_name(path, merge)
 
-        for el in queue:
-            if merge:
-                model_name = os.path.basename(os.path.dirname(el.path))
+            if stdout:
+                if not output or output[-1][0] != txt_name:
+                    output.append((txt_name, []))
 
-                txt_hash[el] = os.path.join(out_path, model_name + ".txt")
+                output[-1][1].append(path)
+            elif txt_name in files:
+                files[txt_name].append(path)
             else:
-                txt_hash[el] = os.path.join(out_path, el.get_component_name() + ".txt")
+                files[txt_name] = [path]
+                output.append((txt_name, files[txt_name]))
+
+        return output
+
+    def __load_group(self, paths):
+        # Parse components of a txt file when it is written; the file is
+        # skipped if one of them can't be parsed
+        return all(self.__get(x) is not None for x in paths)
+
+    @staticmethod
+    def __get_txt_name(path, merge):
+        if merge:
+            return os.path.basename(os.path.dirname(path)) + ".txt"
+
+        return Model.__get_name(path) + ".txt"
 
-            if os.path.exists(txt_hash[el]):
-                os.remove(txt_hash[el])
+    def __get_text(self, path):
+        # Return the text shared by byte-identical component files, or the
+        # component itself, which is streamed as it is written; a re-parsed
+        # file has a new hash and key
+        if self.__texts is not None:
+            text = self.__texts.get(self.__get_text_key(path))
+
+            if text is not None:
+                return text
+
+        return self.__get(path)
+
+    def __get_text_key(self, path):
+        return os.path.basename(path), self.__stamps[path][1]
+
+    def __render_text(self, path):
+        # Texts returned by render() are built anyway, so only they are
+        # shared; the component does not keep its text
+        el = self.__get_text(path)
+
+        if isinstance(el, str):
+            return el
+
+        stream = io.StringIO()
+        el.render_to(stream)
+        text = stream.getvalue()
+
+        if self.__texts is not None:
+            self.__texts.put(self.__get_text_key(path), text)
+
+        return text
+
+    def get_txt_names(self, merge, include_errors=False):
+        """Return names of txt files of the model in the output order.
+
+        Txt files with components that can't be parsed are left out,
+        unless include_errors is True; then nothing is parsed, and names
+        go in the order of component files. Components which were parsed
+        and released are not parsed again.
+        """
+        if include_errors:
+            return list(
+                dict.fromkeys(self.__get_txt_name(x, merge) for x in self.__files)
+            )
 
-        for el in queue:
-            el.to_txt(txt_hash[el], merge)
+        return [
+            txt_name
+            for txt_name, paths in self.__get_output(merge)
+            if all(x in self.__deps or self.__get(x) is not None for x in paths)
+        ]
+
+    def render(self, merge):
+        """Return a list of (txt file name, text) pairs in the output order."""
+        res = []
+
+        for txt_name, paths in self.__get_output(merge):
+            if self.__load_group(paths):
+                res.extend((txt_name, self.__render_text(x)) for x in paths)
+
+        self.__update_index()
+        return res
+
+    def write_to(self, stream, merge):
+        """Write txt of all components to stream in the output order."""
+        self.__write("-", merge, stdout=stream)
+        self.__update_index()
+
+    def print(self, out_path, merge, skip_unchanged=False, changed=None, release=False):
+        """Write txt files and return the number of written and unchanged ones.
+
+        If changed paths of components are given, for example by refresh(),
+        only txt files that contain these components are written: their own
+        txt files, or the merged ones. If release is True, components are
+        dropped from memory once their txt files are written, so only the
+        components of one txt file are kept at a time.
+        """
+        res = self.__write(out_path, merge, skip_unchanged, changed, release)
+        self.__update_index()
+        return res
+
+    def __write(
+        self,
+        out_path,
+        merge,
+        skip_unchanged=False,
+        changed=None,
+        release=False,
+        stdout=None,
+    ):
+        written = unchanged = 0
+
+        output = self.__get_output(merge, changed, out_path == "-")
+
+        for txt_name, paths in output:
+            if not self.__load_group(paths):
+                continue
+
+            group = [(txt_name, self.__get_text(x)) for x in paths]
+            w, u = write_txt(group, out_path, merge, skip_unchanged, stdout)
+            written += w
+            unchanged += u
+
+            if release:
+                for path in paths:
+                    self.__objs.pop(path, None)
+
+        return written, unchanged
+
+
+class _HashingReader:
+    # File object wrapper which computes the hash of the data read from it
+
+    def __init__(self, f):
+        self.__f = f
+        self.__hash = hashlib.sha256()
+        self.content_id = getattr(f, "content_id", None)
+
+    def read(self, size=-1):
+        data = self.__f.read(size)
+        self.__hash.update(data)
+        return data
+
+    def digest(self):
+        # Content found in the cache by its id is not read
+        if self.content_id is not None:
+            return hashlib.sha256(self.content_id.encode("utf8")).digest()
+
+        return self.__hash.digest()
@@ -0,0 +1,130 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+import filecmp
+import os
+import sys
+import uuid
+
+from eventb_to_txt import stats
+
+# Size of the write buffer of output files
+BUFFER_SIZE = 1024 * 1024
+
+
+class AtomicFile:
+    """Context manager that writes a file through a temporary file.
+
+    The temporary file is created in the same directory and replaces the
+    target only if the block completes, so readers never see a partially
+    written file. If skip_unchanged is True and the target already has
+    the same content, it is left untouched. After the block, changed
+    tells whether the target was written.
+    """
+
+    def __init__(self, path, skip_unchanged=False):
+        self.path = path
+        self.tmp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex[:8])
+        self.skip_unchanged = skip_unchanged
+        self.changed = False
+        self.__f = None
+
+    def __enter__(self):
+        self.__f = open(self.tmp_path, "x", encoding="utf8", buffering=BUFFER_SIZE)
+        return self.__f
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.__f.close()
+
+            if exc_type is None:
+                if self.skip_unchanged and self.__is_unchanged():
+                    os.remove(self.tmp_path)
+                else:
+                    os.replace(self.tmp_path, self.path)
+                    self.changed = True
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+    def __is_unchanged(self):
+        try:
+            if os.path.getsize(self.path) != os.path.getsize(self.tmp_path):
+                return False
+
+            return filecmp.cmp(self.path, self.tmp_path, shallow=False)
+        except OSError:
+            return False
+
+
+def write_txt(output, out_path, merge, skip_unchanged=False, stdout=None):
+    """Write (txt file name, component or text) pairs to the output directory.
+
+    Each txt file is opened once; in the merge mode its parts are
+    separated by empty lines. If out_path is "-", everything is printed
+    to stdout (sys.stdout by default). Return the number of written and
+    unchanged files.
+    """
+    written = 0
+    unchanged = 0
+
+    if out_path == "-":
+        if stdout is None:
+            stdout = sys.stdout
+
+        for _, el in output:
+            _write(stdout, el)
+        return written, unchanged
+
+    files = dict()
+    for txt_name, el in output:
+        files.setdefault(txt_name, []).append(el)
+
+    separator = "\n\n" if merge else ""
+
+    for txt_name, els in files.items():
+        path = os.path.join(out_path, txt_name)
+
+        # Existing files are compared with the text in memory, so
+        # unchanged ones are only read
+        if skip_unchanged:
+            text = separator.join(str(x) for x in els)
+
+            if _has_content(path, text):
+                unchanged += 1
+                continue
+
+            els = [text]
+
+        with stats.phase("write"), AtomicFile(path) as f:
+            for i, el in enumerate(els):
+                if i:
+                    f.write(separator)
+
+                _write(f, el)
+
+        written += 1
+
+    return written, unchanged
+
+
+def _has_content(path, text):
+    # Text files are written with the platform line separators
+    data = text.replace("\n", os.linesep).encode("utf8")
+
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+
+        with open(path, "rb") as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def _write(stream, el):
+    if isinstance(el, str):
+        stream.write(el)
+    else:
+        el.render_to(stream)
@@ -0,0 +1,113 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Compact records for the elements of parsed machines and contexts.
+
+Optional attributes that are missing in the component file are None,
+optional lists of events are empty tuples until the first element is
+added.
+"""
+
+
+class Record:
+    __slots__ = ()
+
+    @classmethod
+    def fields(cls):
+        return [
+            x for c in reversed(cls.__mro__) for x in c.__dict__.get("__slots__", ())
+        ]
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+
+        return all(getattr(self, x) == getattr(other, x) for x in self.fields())
+
+    def __repr__(self):
+        return "{}({})".format(
+            type(self).__name__,
+            ", ".join("{}={!r}".format(x, getattr(self, x)) for x in self.fields()),
+        )
+
+
+class Identifier(Record):
+    """Carrier set, constant, variable or event parameter."""
+
+    __slots__ = ("id", "comment")
+
+    def __init__(self, id, comment=None):
+        self.id = id
+        self.comment = comment
+
+
+class Axiom(Record):
+    """Labelled predicate which may be a theorem."""
+
+    __slots__ = ("label", "predicate", "theorem", "comment")
+
+    def __init__(self, label, predicate, theorem=None, comment=None):
+        self.label = label
+        self.predicate = predicate
+        self.theorem = theorem
+        self.comment = comment
+
+
+class Invariant(Axiom):
+    __slots__ = ()
+
+
+class Guard(Axiom):
+    __slots__ = ()
+
+
+class Witness(Record):
+    __slots__ = ("label", "predicate", "comment")
+
+    def __init__(self, label, predicate, comment=None):
+        self.label = label
+        self.predicate = predicate
+        self.comment = comment
+
+
+class Action(Record):
+    __slots__ = ("label", "assignment", "comment")
+
+    def __init__(self, label, assignment, comment=None):
+        self.label = label
+        self.assignment = assignment
+        self.comment = comment
+
+
+class Variant(Record):
+    __slots__ = ("expression", "comment")
+
+    def __init__(self, expression, comment=None):
+        self.expression = expression
+        self.comment = comment
+
+
+class Event(Record):
+    __slots__ = (
+        "label",
+        "convergence",
+        "extended",
+        "comment",
+        "refines",
+        "parameters",
+        "guards",
+        "witnesses",
+        "actions",
+    )
+
+    def __init__(self, label, convergence, extended, comment=None):
+        self.label = label
+        self.convergence = convergence
+        self.extended = extended
+        self.comment = comment
+        self.refines = None
+        self.parameters = ()
+        self.guards = ()
+        self.witnesses = ()
+        self.actions = ()
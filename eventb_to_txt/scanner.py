@@ -0,0 +1,95 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+import os
+import xml.parsers.expat
+
+from eventb_to_txt.abstract import EventBComponent
+from eventb_to_txt.context import Context
+from eventb_to_txt.machine import Machine
+
+# Size of chunks in which component files are fed to the scanner
+CHUNK_SIZE = 64 * 1024
+
+
+class Header:
+    """Name and dependencies of a component, read without parsing its content.
+
+    Provides the same get_component_name() and get_dependencies() methods
+    as parsed components, so it can be used in a DependencyGraph.
+    """
+
+    __slots__ = ("path", "refines", "sees", "extends")
+
+    def __init__(self, path):
+        self.path = path
+        self.refines = ""
+        self.sees = []
+        self.extends = []
+
+    @classmethod
+    def from_component(cls, component):
+        """Return the header of a parsed context or machine."""
+        header = cls(component.path)
+        header.refines = getattr(component, "refines", "")
+        header.sees = list(getattr(component, "sees", []))
+        header.extends = list(getattr(component, "extends", []))
+        return header
+
+    def get_component_name(self):
+        return os.path.basename(os.path.splitext(self.path)[0])
+
+    def get_dependencies(self):
+        dependencies = [self.refines] if self.refines else []
+        return dependencies + self.sees + self.extends
+
+
+def scan_header(path, fileobj=None):
+    """Read refines, sees and extends relations of the component file.
+
+    Only the top-level elements are looked at: the scanner does not build
+    any elements and skips the content of events, axioms and so on.
+    Rodin does not guarantee the order of top-level elements, so the file
+    is read up to the closing tag of its root element.
+    """
+    if fileobj is None:
+        with open(path, "rb") as f:
+            return scan_header(path, f)
+
+    header = Header(path)
+    depth = 0
+    closed = False
+
+    def start(tag, attrs):
+        nonlocal depth
+        depth += 1
+
+        if depth != 2:
+            return
+
+        if tag == Machine.REFINES_MACHINE:
+            header.refines = attrs[EventBComponent.TARGET]
+        elif tag == Machine.SEES:
+            header.sees.append(attrs[EventBComponent.TARGET])
+        elif tag == Context.EXTENDS:
+            header.extends.append(attrs[EventBComponent.TARGET])
+
+    def end(tag):
+        nonlocal depth, closed
+        depth -= 1
+        closed = depth == 0
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+
+    # Trailing data after the root element is not read
+    while not closed:
+        chunk = fileobj.read(CHUNK_SIZE)
+        parser.Parse(chunk, not chunk)
+
+        if not chunk:
+            break
+
+    return header
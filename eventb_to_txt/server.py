@@ -0,0 +1,248 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Conversion daemon listening on a Unix socket.
+
+Parsed models are kept in memory between requests, so a repeated
+conversion only stats component files and re-parses the changed ones.
+A request is a single line with a JSON object:
+
+    {"in_path": "/abs/model", "out_path": "/abs/out", "merge": false,
+     "component": null, "skip_unchanged": false, "ignore": [".*"],
+     "nested": false}
+
+The response is a single JSON line with "written" and "unchanged"
+counters, with "output" text if out_path is "-", or with "error". Txt
+files of components that can't be parsed are not written, such
+components are listed in "errors".
+"""
+
+import io
+import json
+import os
+import socket
+import socketserver
+import tarfile
+import threading
+import zipfile
+
+from eventb_to_txt.cache import TextCache
+from eventb_to_txt.model import Model
+from eventb_to_txt.output import write_txt
+from eventb_to_txt.source import (
+    DEFAULT_IGNORE,
+    DirectorySource,
+    MemorySource,
+    ZipSource,
+    is_tarfile,
+    strip_archive_ext,
+)
+
+# Request field -> allowed types of its value; only in_path is required
+REQUEST_FIELDS = {
+    "in_path": str,
+    "out_path": str,
+    "merge": bool,
+    "component": (str, type(None)),
+    "skip_unchanged": bool,
+    "ignore": list,
+    "nested": bool,
+}
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, cache=None):
+        self.socket_path = socket_path
+        self.cache = cache
+        self.texts = TextCache()
+        self.__lock = threading.Lock()
+        # (in_path, ignore, nested) -> (archive stat or None, source)
+        self.__sources = dict()
+        # (source key, model path, component) -> _ModelEntry
+        self.__models = dict()
+
+        # A socket left by a daemon that was killed is replaced
+        if os.path.exists(socket_path) and not _is_listening(socket_path):
+            os.remove(socket_path)
+
+        super().__init__(socket_path, _Handler)
+
+    def server_close(self):
+        super().server_close()
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def convert(self, request):
+        """Convert the model as described by the request, return the response."""
+        error = _check_request(request)
+        if error is not None:
+            return {"error": "Invalid request: {}".format(error)}
+
+        try:
+            return self.__convert(request)
+        except RuntimeError as e:
+            return {"error": str(e)}
+        except (OSError, zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+            return {"error": "{}: {}".format(type(e).__name__, e)}
+
+    def __convert(self, request):
+        in_path = request["in_path"]
+        out_path = request.get("out_path", "-")
+        merge = request.get("merge", False) or out_path == "-"
+        component = request.get("component")
+        key = (
+            in_path,
+            tuple(request.get("ignore", DEFAULT_IGNORE)),
+            request.get("nested", False),
+        )
+        source = self.__get_source(key)
+
+        # Directories are walked again to find new models
+        model_paths = source.find_model_paths()
+
+        if component:
+            model_paths = Model.filter_model_paths(model_paths, component, source)
+
+        rendered = []
+        errors = []
+        for model_path in model_paths:
+            output, model_errors = self.__render(
+                key, source, model_path, component, merge
+            )
+            rendered.extend(output)
+            errors.extend(model_errors)
+
+        response = dict()
+
+        if errors:
+            response["errors"] = errors
+
+        if out_path == "-":
+            stdout = io.StringIO()
+            write_txt(rendered, out_path, merge, stdout=stdout)
+            response["output"] = stdout.getvalue()
+        else:
+            os.makedirs(out_path, exist_ok=True)
+            written, unchanged = write_txt(
+                rendered, out_path, merge, request.get("skip_unchanged", False)
+            )
+            response["written"] = written
+            response["unchanged"] = unchanged
+
+        return response
+
+    def __get_source(self, key):
+        in_path, ignore, nested = key
+        archive = None
+        is_zip = zipfile.is_zipfile(in_path)
+
+        if is_zip or is_tarfile(in_path):
+            st = os.stat(in_path)
+            archive = (st.st_mtime_ns, st.st_size)
+
+        with self.__lock:
+            old = self.__sources.get(key)
+
+            if old is not None and old[0] == archive:
+                return old[1]
+
+            # Models read from the replaced archive are dropped
+            if old is not None:
+                old[1].close()
+                self.__models = {k: v for k, v in self.__models.items() if k[0] != key}
+
+            if archive is None:
+                source = DirectorySource(in_path, ignore, nested)
+            elif is_zip:
+                source = ZipSource(in_path, ignore, nested)
+            else:
+                with open(in_path, "rb") as f:
+                    source = MemorySource.from_tar(
+                        f, strip_archive_ext(in_path), ignore, nested
+                    )
+
+            self.__sources[key] = (archive, source)
+            return source
+
+    def __render(self, key, source, model_path, component, merge):
+        with self.__lock:
+            entry = self.__models.setdefault(
+                (key, model_path, component), _ModelEntry()
+            )
+
+        # Requests for different models are served concurrently
+        with entry.lock:
+            if entry.model is None:
+                entry.model = Model(
+                    model_path, self.cache, source, component, texts=self.texts
+                )
+            else:
+                entry.model.refresh()
+
+            output = entry.model.render(merge)
+            errors = ["{}: {}".format(*x) for x in entry.model.errors.items()]
+            return output, errors
+
+
+class _ModelEntry:
+    __slots__ = ("lock", "model")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.model = None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+
+        try:
+            request = json.loads(line.decode("utf8"))
+        except ValueError as e:
+            response = {"error": "Invalid request: {}".format(e)}
+        else:
+            response = self.server.convert(request)
+
+        self.wfile.write(json.dumps(response).encode("utf8") + b"\n")
+
+
+def _check_request(request):
+    # Return what is wrong with the request, or None if it is valid
+    if not isinstance(request, dict):
+        return "a JSON object is expected"
+
+    if "in_path" not in request:
+        return "in_path is missing"
+
+    for name, types in REQUEST_FIELDS.items():
+        if name in request and not isinstance(request[name], types):
+            return "{} has a wrong type".format(name)
+
+    if not all(isinstance(x, str) for x in request.get("ignore", [])):
+        return "ignore must be a list of strings"
+
+    return None
+
+
+def _is_listening(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(socket_path)
+        except OSError:
+            return False
+
+    return True
+
+
+def send_request(socket_path, request):
+    """Send the request to the daemon and return its response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path)
+        s.sendall(json.dumps(request).encode("utf8") + b"\n")
+
+        with s.makefile("rb") as f:
+            return json.loads(f.readline().decode("utf8"))
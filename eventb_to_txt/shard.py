@@ -0,0 +1,104 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Deterministic split of models between several converter runs.
+
+Models are assigned to shards by the total size of their component
+files: the largest models go first, each one to the least loaded shard.
+Ties are broken by model paths relative to the source root, so every
+run with the same input and shard count gets the same assignment,
+wherever the input is located. Each run writes a manifest of its
+models and txt files, manifests of all shards can be combined with
+combine_manifests().
+"""
+
+import argparse
+import heapq
+import json
+import os
+
+from eventb_to_txt.output import AtomicFile
+
+MANIFEST_NAME = "eventb-to-txt-shard-{}-of-{}.json"
+
+
+def parse_shard(value):
+    """Parse "INDEX/COUNT", where INDEX starts from 1."""
+    try:
+        index, count = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("must be INDEX/COUNT, such as 1/4")
+
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError("INDEX must be between 1 and COUNT")
+
+    return index, count
+
+
+def get_model_size(model_path, source):
+    context_files, machine_files = source.find_component_files(model_path)
+    return sum(source.get_size(x) for x in context_files + machine_files)
+
+
+def assign(sizes, count):
+    """Split {relative model path: size} into count lists of model paths."""
+    shards = [[] for _ in range(count)]
+    loads = [(0, i) for i in range(count)]
+
+    for path in sorted(sizes, key=lambda x: (-sizes[x], x)):
+        load, i = heapq.heappop(loads)
+        shards[i].append(path)
+        heapq.heappush(loads, (load + sizes[path], i))
+
+    return shards
+
+
+class Shard:
+    def __init__(self, index, count, model_paths, source):
+        self.index = index
+        self.count = count
+        self.root = source.root
+        self.sizes = {self.__relpath(x): get_model_size(x, source) for x in model_paths}
+
+        selected = set(assign(self.sizes, count)[index - 1])
+        # Models are converted in the order in which they were found
+        self.model_paths = [x for x in model_paths if self.__relpath(x) in selected]
+
+    def __relpath(self, model_path):
+        return os.path.relpath(model_path, self.root)
+
+    def write_manifest(self, out_path, outputs):
+        """Write the manifest with txt file names of each model to out_path."""
+        manifest = {
+            "shard": self.index,
+            "count": self.count,
+            "models": [
+                {
+                    "path": self.__relpath(x),
+                    "size": self.sizes[self.__relpath(x)],
+                    "outputs": outputs.get(x, []),
+                }
+                for x in self.model_paths
+            ],
+        }
+
+        path = os.path.join(out_path, MANIFEST_NAME.format(self.index, self.count))
+        with AtomicFile(path) as f:
+            json.dump(manifest, f, indent=2)
+            f.write("\n")
+
+
+def combine_manifests(manifests):
+    """Check that manifests cover every shard once and return all models."""
+    shards = sorted(x["shard"] for x in manifests)
+    counts = {x["count"] for x in manifests}
+
+    if len(counts) != 1 or shards != list(range(1, counts.pop() + 1)):
+        raise RuntimeError("Manifests do not cover all shards exactly once")
+
+    return [
+        x
+        for manifest in sorted(manifests, key=lambda x: x["shard"])
+        for x in manifest["models"]
+    ]
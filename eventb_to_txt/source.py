@@ -0,0 +1,484 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+import copy
+import fnmatch
+import io
+import os
+import posixpath
+import subprocess
+import tarfile
+import zipfile
+
+# Hidden files and directories, such as .metadata of a Rodin workspace or .git
+DEFAULT_IGNORE = (".*",)
+
+NO_MODELS = "It seems that the specified directory does not contain any Event-B models"
+
+
+def is_context_file(path):
+    return path.endswith(".buc")
+
+
+def is_machine_file(path):
+    return path.endswith(".bum")
+
+
+def is_component_file(path):
+    return is_context_file(path) or is_machine_file(path)
+
+
+def is_tarfile(path):
+    """Check whether the path is a tar archive, possibly compressed."""
+    return os.path.isfile(path) and tarfile.is_tarfile(path)
+
+
+def strip_archive_ext(path):
+    """Return the path of the directory the archive would be extracted into."""
+    for ext in (".tar.gz", ".tar.xz", ".tar.bz2"):
+        if path.endswith(ext):
+            return path[: -len(ext)]
+
+    return os.path.splitext(path)[0]
+
+
+class DirectorySource:
+    """Event-B component files stored in a directory.
+
+    The directory tree is walked once, skipping directories and files
+    which names match one of the ignore patterns. Each directory with
+    component files is a separate model. If nested is True, models also
+    include component files from all their subdirectories.
+    """
+
+    def __init__(self, in_path, ignore=DEFAULT_IGNORE, nested=False):
+        self.in_path = os.path.abspath(in_path)
+        # Directory that contains all models
+        self.root = (
+            self.in_path
+            if os.path.isdir(self.in_path)
+            else os.path.dirname(self.in_path)
+        )
+        self.ignore = list(ignore)
+        self.nested = nested
+        self.__models = None
+
+    def find_model_paths(self):
+        model_paths = []
+
+        if os.path.isdir(self.in_path):
+            self.__models = self.__walk(self.in_path)
+            model_paths = list(self.__models)
+        elif os.path.isfile(self.in_path):
+            if is_component_file(self.in_path):
+                model_paths = [self.in_path]
+
+        if not model_paths:
+            raise RuntimeError(NO_MODELS)
+
+        return model_paths
+
+    def find_component_files(self, model_path):
+        """Return context and machine files of the model."""
+        model_path = os.path.abspath(model_path)
+
+        if os.path.isfile(model_path):
+            if is_context_file(model_path):
+                return [model_path], []
+            elif is_machine_file(model_path):
+                return [], [model_path]
+            return [], []
+
+        models = self.__models
+        if models is None or not self.__is_subpath(model_path, self.in_path):
+            models = self.__walk(model_path, recursive=self.nested)
+
+        if not self.nested:
+            return models.get(model_path, ([], []))
+
+        context_files = []
+        machine_files = []
+
+        for path, (contexts, machines) in models.items():
+            if self.__is_subpath(path, model_path):
+                context_files.extend(contexts)
+                machine_files.extend(machines)
+
+        return context_files, machine_files
+
+    def for_model(self, model_path):
+        """Return a copy of the source that knows only the given model."""
+        res = copy.copy(self)
+
+        if self.__models is not None:
+            model_path = os.path.abspath(model_path)
+            res.__models = {
+                path: files
+                for path, files in self.__models.items()
+                if self.__is_subpath(path, model_path)
+            }
+
+        return res
+
+    @staticmethod
+    def __is_subpath(path, parent):
+        return path == parent or path.startswith(os.path.join(parent, ""))
+
+    def __is_ignored(self, name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore)
+
+    def __walk(self, path, recursive=True):
+        # Return {directory: (context files, machine files)}
+        models = dict()
+        stack = [path]
+
+        while stack:
+            top = stack.pop()
+            context_files = []
+            machine_files = []
+            subdirs = []
+
+            # Sorted, so that models are found in the same order everywhere
+            try:
+                entries = sorted(os.scandir(top), key=lambda x: x.name)
+            except OSError:
+                continue
+
+            for entry in entries:
+                if self.__is_ignored(entry.name):
+                    continue
+
+                if entry.is_dir():
+                    subdirs.append(entry.path)
+                elif is_context_file(entry.name) and entry.is_file():
+                    context_files.append(entry.path)
+                elif is_machine_file(entry.name) and entry.is_file():
+                    machine_files.append(entry.path)
+
+            if context_files or machine_files:
+                models[top] = (context_files, machine_files)
+
+            if recursive:
+                stack.extend(reversed(subdirs))
+
+        return models
+
+    def open(self, path):
+        return open(path, "rb")
+
+    def stat(self, path):
+        """Return a value that changes when the component file changes."""
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def get_size(self, path):
+        return os.stat(path).st_size
+
+    def close(self):
+        pass
+
+
+class _MemberSource:
+    # Component files known by their virtual paths in self.members
+
+    def __init__(self, root, ignore, nested):
+        self.root = root
+        self.ignore = list(ignore)
+        self.nested = nested
+        self.members = dict()
+
+    def _add_member(self, name, value):
+        parts = name.split("/")
+
+        if not is_component_file(name) or any(
+            fnmatch.fnmatch(part, pattern) for part in parts for pattern in self.ignore
+        ):
+            return
+
+        self.members[os.path.join(self.root, *parts)] = value
+
+    def find_model_paths(self):
+        # Models are listed in the order of their first members
+        model_paths = dict.fromkeys(os.path.dirname(path) for path in self.members)
+
+        if not model_paths:
+            raise RuntimeError(NO_MODELS)
+
+        return list(model_paths)
+
+    def find_component_files(self, model_path):
+        if model_path in self.members:
+            paths = [model_path]
+        elif self.nested:
+            prefix = os.path.join(model_path, "")
+            paths = [p for p in self.members if p.startswith(prefix)]
+        else:
+            paths = [p for p in self.members if os.path.dirname(p) == model_path]
+
+        context_files = [p for p in paths if is_context_file(p)]
+        machine_files = [p for p in paths if is_machine_file(p)]
+
+        return context_files, machine_files
+
+    def for_model(self, model_path):
+        # Sent to worker processes instead of the whole source, so that
+        # members of other models are not pickled for each of them
+        res = copy.copy(self)
+        context_files, machine_files = self.find_component_files(model_path)
+        res.members = {x: self.members[x] for x in context_files + machine_files}
+        return res
+
+    def close(self):
+        pass
+
+
+class ZipSource(_MemberSource):
+    """Event-B component files read straight from a zip archive.
+
+    Members get paths as if the archive was extracted into a directory
+    named after it, so "model.zip/project/M0.bum" is known as
+    "model/project/M0.bum". Ignore patterns and nested models work in the
+    same way as in DirectorySource.
+    """
+
+    def __init__(self, zip_path, ignore=DEFAULT_IGNORE, nested=False):
+        self.zip_path = os.path.abspath(zip_path)
+        super().__init__(os.path.splitext(self.zip_path)[0], ignore, nested)
+        self.__zip_f = None
+
+        for name in self.__get_zip_f().namelist():
+            self._add_member(name, name)
+
+    def __get_zip_f(self):
+        # Opened lazily, so that the source can be sent to worker processes
+        if self.__zip_f is None:
+            self.__zip_f = zipfile.ZipFile(self.zip_path)
+
+        return self.__zip_f
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_ZipSource__zip_f"] = None
+        return state
+
+    def close(self):
+        if self.__zip_f is not None:
+            self.__zip_f.close()
+            self.__zip_f = None
+
+    def open(self, path):
+        return self.__get_zip_f().open(self.members[path])
+
+    def stat(self, path):
+        info = self.__get_zip_f().getinfo(self.members[path])
+        return info.date_time, info.file_size, info.CRC
+
+    def get_size(self, path):
+        return self.__get_zip_f().getinfo(self.members[path]).file_size
+
+
+class GitSource(_MemberSource):
+    """Event-B component files read from a revision of a git repository.
+
+    Blobs of the revision are listed with a single "git ls-tree" call and
+    read through one "git cat-file --batch" process, without a checkout.
+    If in_path is a subdirectory of the repository, only its subtree is
+    read, and members get paths under in_path as if it was checked out.
+    """
+
+    def __init__(self, in_path, revision, ignore=DEFAULT_IGNORE, nested=False):
+        self.in_path = os.path.abspath(in_path)
+        self.revision = revision
+        super().__init__(self.in_path, ignore, nested)
+        self.__process = None
+
+        try:
+            res = subprocess.run(
+                ["git", "ls-tree", "-r", "-l", "-z", revision],
+                cwd=self.in_path,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=True,
+            )
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(
+                "Can't read revision {!r} of {!r}: {}".format(
+                    revision, in_path, e.stderr.decode("utf8", "replace").strip()
+                )
+            )
+
+        for line in res.stdout.decode("utf8").split("\0"):
+            if not line:
+                continue
+
+            info, name = line.split("\t", 1)
+            _, object_type, object_id, size = info.split()
+
+            if object_type == "blob":
+                self._add_member(name, (object_id, int(size)))
+
+    def __getstate__(self):
+        # Each worker process starts its own cat-file process
+        state = self.__dict__.copy()
+        state["_GitSource__process"] = None
+        return state
+
+    def __get_process(self):
+        if self.__process is None:
+            self.__process = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                cwd=self.in_path,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+
+        return self.__process
+
+    def close(self):
+        if self.__process is not None:
+            self.__process.stdin.close()
+            self.__process.wait()
+            self.__process.stdout.close()
+            self.__process = None
+
+    def read_blob(self, object_id):
+        process = self.__get_process()
+        process.stdin.write(object_id.encode("ascii") + b"\n")
+        process.stdin.flush()
+
+        header = process.stdout.readline().split()
+        if len(header) != 3:
+            raise OSError("Can't read git object {}".format(object_id))
+
+        size = int(header[2])
+        data = process.stdout.read(size + 1)
+        return data[:size]
+
+    def open(self, path):
+        return _GitBlob(self, self.members[path][0])
+
+    def stat(self, path):
+        # Blob hashes change with the content only
+        return self.members[path][0]
+
+    def get_size(self, path):
+        return self.members[path][1]
+
+
+class MemorySource(_MemberSource):
+    """Event-B component files held in memory.
+
+    Files are given as a mapping of names, such as "project/M0.bum", to
+    bytes or binary file objects, which are read once. Models get paths
+    under root, as if the files were stored in a directory with this
+    name. The file system is never accessed.
+    """
+
+    def __init__(self, files, root="model", ignore=DEFAULT_IGNORE, nested=False):
+        super().__init__(root, ignore, nested)
+
+        for name, data in files.items():
+            if not isinstance(data, (bytes, bytearray)):
+                data = data.read()
+
+            self._add_member(name, bytes(data))
+
+    @classmethod
+    def from_zip(cls, fileobj, root="model", ignore=DEFAULT_IGNORE, nested=False):
+        """Read component files of a zip archive given as bytes or file object."""
+        if isinstance(fileobj, (bytes, bytearray)):
+            fileobj = io.BytesIO(fileobj)
+
+        with zipfile.ZipFile(fileobj) as zip_f:
+            files = {x: zip_f.read(x) for x in zip_f.namelist() if is_component_file(x)}
+
+        return cls(files, root, ignore, nested)
+
+    @classmethod
+    def from_tar(cls, fileobj, root="model", ignore=DEFAULT_IGNORE, nested=False):
+        """Read component files of a tar archive given as a binary stream.
+
+        The archive may be compressed with gzip, bzip2 or xz. It is read
+        member by member, so the stream doesn't need to be seekable, and
+        other members are skipped without being kept in memory.
+        """
+        files = dict()
+
+        with tarfile.open(fileobj=fileobj, mode="r|*") as tar_f:
+            for info in tar_f:
+                # "./project/M0.bum" is the same as "project/M0.bum"
+                name = posixpath.normpath(info.name).lstrip("/")
+
+                if info.isfile() and is_component_file(name):
+                    files[name] = tar_f.extractfile(info).read()
+
+        return cls(files, root, ignore, nested)
+
+    @classmethod
+    def from_archive(cls, fileobj, root="model", ignore=DEFAULT_IGNORE, nested=False):
+        """Read component files of a zip or tar archive given as bytes or stream.
+
+        Zip archives are read into memory at once, as their directory is
+        stored at the end. Tar archives are streamed with from_tar().
+        """
+        if isinstance(fileobj, (bytes, bytearray)):
+            fileobj = io.BytesIO(fileobj)
+
+        head = fileobj.read(4)
+
+        if head.startswith(b"PK"):
+            return cls.from_zip(head + fileobj.read(), root, ignore, nested)
+
+        return cls.from_tar(_PrefixedReader(head, fileobj), root, ignore, nested)
+
+    def open(self, path):
+        return io.BytesIO(self.members[path])
+
+    def stat(self, path):
+        return len(self.members[path])
+
+    def get_size(self, path):
+        return len(self.members[path])
+
+
+class _PrefixedReader:
+    # Stream that returns already read bytes before the rest of the data
+
+    def __init__(self, head, f):
+        self.__head = head
+        self.__f = f
+
+    def read(self, size=-1):
+        if size < 0:
+            data = self.__head + self.__f.read()
+            self.__head = b""
+            return data
+
+        # Whole blocks are returned, as tarfile detects compression by one read
+        head = self.__head[:size]
+        self.__head = self.__head[size:]
+        return head + self.__f.read(size - len(head))
+
+
+class _GitBlob:
+    # Blob of a GitSource, which is read on the first read() call, so that
+    # it is not read at all if the component is found in the cache
+
+    def __init__(self, source, object_id):
+        self.content_id = "git blob " + object_id
+        self.__source = source
+        self.__object_id = object_id
+        self.__f = None
+
+    def read(self, size=-1):
+        if self.__f is None:
+            self.__f = io.BytesIO(self.__source.read_blob(self.__object_id))
+
+        return self.__f.read(size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.__f = None
@@ -0,0 +1,205 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Per-phase timing and memory instrumentation.
+
+Code marks its phases with "with stats.phase(name, component):". Nothing
+is recorded until enable() is called, and a disabled phase costs a
+single function call:
+
+    s = stats.enable()
+    Model(model_path).print(out_path, merge)
+    stats.disable()
+    print(s.to_dict())
+"""
+
+import contextlib
+import json
+import time
+import tracemalloc
+
+_NULL_PHASE = contextlib.nullcontext()
+_active = None
+
+
+def phase(name, component=None):
+    """Return a context manager that records a phase of the active Stats."""
+    if _active is None:
+        return _NULL_PHASE
+
+    return _active.phase(name, component)
+
+
+def enable(stats=None):
+    """Start recording phases to stats (a new Stats by default) and return it."""
+    global _active
+
+    if stats is None:
+        stats = Stats()
+
+    _active = stats
+    stats.start()
+    return stats
+
+
+def get_active():
+    return _active
+
+
+def disable():
+    global _active
+
+    if _active is not None:
+        _active.stop()
+        _active = None
+
+
+class _Frame:
+    __slots__ = ("name", "component", "start", "memory", "peak", "children_time")
+
+    def __init__(self, name, component, memory):
+        self.name = name
+        self.component = component
+        self.memory = memory
+        self.peak = memory
+        self.children_time = 0
+        self.start = time.perf_counter()
+
+
+class Stats:
+    """Wall time, number of calls and peak memory per phase and component.
+
+    Time of a phase includes time of phases nested into it, self_time
+    does not. Peak memory is measured with tracemalloc relative to the
+    memory allocated at the start of the phase.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.phases = dict()
+        self.components = dict()
+        self.__stack = []
+        self.__started_tracing = False
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.__started_tracing = True
+
+    def stop(self):
+        if self.__started_tracing:
+            tracemalloc.stop()
+            self.__started_tracing = False
+
+    @contextlib.contextmanager
+    def phase(self, name, component=None):
+        self.__push(name, component)
+        try:
+            yield
+        finally:
+            self.__pop()
+
+    def __get_memory(self):
+        if not tracemalloc.is_tracing():
+            return 0, 0
+
+        return tracemalloc.get_traced_memory()
+
+    def __update_peaks(self):
+        peak = self.__get_memory()[1]
+
+        for frame in self.__stack:
+            frame.peak = max(frame.peak, peak)
+
+    def __push(self, name, component):
+        self.__update_peaks()
+
+        if hasattr(tracemalloc, "reset_peak") and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+        self.__stack.append(_Frame(name, component, self.__get_memory()[0]))
+
+    def __pop(self):
+        self.__update_peaks()
+
+        frame = self.__stack.pop()
+        elapsed = time.perf_counter() - frame.start
+
+        if self.__stack:
+            self.__stack[-1].children_time += elapsed
+
+        self.__add(
+            self.phases.setdefault(frame.name, self.__new_entry()),
+            1,
+            elapsed,
+            elapsed - frame.children_time,
+            frame.peak - frame.memory,
+        )
+
+        if frame.component is not None:
+            phases = self.components.setdefault(frame.component, dict())
+            self.__add(
+                phases.setdefault(frame.name, self.__new_entry()),
+                1,
+                elapsed,
+                elapsed - frame.children_time,
+                frame.peak - frame.memory,
+            )
+
+    @staticmethod
+    def __new_entry():
+        return {"calls": 0, "time": 0, "self_time": 0, "peak_memory": 0}
+
+    @staticmethod
+    def __add(entry, calls, elapsed, self_time, peak):
+        entry["calls"] += calls
+        entry["time"] += elapsed
+        entry["self_time"] += self_time
+        entry["peak_memory"] = max(entry["peak_memory"], peak)
+
+    def merge(self, other):
+        """Add statistics recorded by other Stats, for example in a worker."""
+        for name, entry in other.phases.items():
+            self.__add(
+                self.phases.setdefault(name, self.__new_entry()),
+                entry["calls"],
+                entry["time"],
+                entry["self_time"],
+                entry["peak_memory"],
+            )
+
+        for component, phases in other.components.items():
+            own = self.components.setdefault(component, dict())
+
+            for name, entry in phases.items():
+                self.__add(
+                    own.setdefault(name, self.__new_entry()),
+                    entry["calls"],
+                    entry["time"],
+                    entry["self_time"],
+                    entry["peak_memory"],
+                )
+
+    def to_dict(self, slowest=10):
+        """Return statistics of phases and of the slowest components."""
+        components = [
+            {
+                "path": path,
+                "time": sum(x["self_time"] for x in phases.values()),
+                "phases": phases,
+            }
+            for path, phases in self.components.items()
+        ]
+        components.sort(key=lambda x: x["time"], reverse=True)
+
+        return {"phases": self.phases, "slowest_components": components[:slowest]}
+
+    def dump(self, f, slowest=10):
+        json.dump(self.to_dict(slowest), f, indent=2)
+        f.write("\n")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_Stats__started_tracing"] = False
+        return state
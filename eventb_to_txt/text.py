@@ -0,0 +1,58 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+"""Normalisation of multiline predicates, assignments and comments.
+
+Rodin stores text with "\\r\\n" or "\\n" line breaks and with tabs.
+Continuation lines are indented to the column where the text starts,
+tabs are expanded. Most predicates are single-line: for them the text
+is only searched, and a new string is built only by the passes that
+actually change something.
+"""
+
+TAB_SIZE = 4
+TAB = " " * TAB_SIZE
+
+# Line break followed by the continuation indent, cached by width
+_line_breaks = dict()
+
+
+def line_break(width):
+    """Return a line break followed by width spaces."""
+    res = _line_breaks.get(width)
+
+    if res is None:
+        res = _line_breaks[width] = "\n" + " " * width
+
+    return res
+
+
+def reindent(text, width):
+    """Indent continuation lines of text by width spaces, expand tabs."""
+    if "\n" in text:
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        text = text.replace("\n", line_break(width))
+
+    if "\t" in text:
+        text = text.replace("\t", TAB)
+
+    return text
+
+
+def join_lines(text):
+    """Replace line breaks of text with spaces."""
+    if "\n" in text:
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        text = text.replace("\n", " ")
+
+    return text
+
+
+def normalize_newlines(text):
+    if "\r" in text:
+        text = text.replace("\r\n", "\n")
+
+    return text
@@ -0,0 +1,126 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+from eventb_to_txt.model import Model
+
+# Seconds between two checks of component files
+POLL_INTERVAL = 1.0
+
+
+class Watcher:
+    """Keeps models of the source in memory and converts them on changes.
+
+    Each poll walks the source to find new models and refreshes the known
+    ones: only changed component files are parsed again, and only txt
+    files containing them are written. Txt files of removed components
+    and models are deleted. Errors, such as a file that Rodin
+    has not finished saving yet, are reported once and retried on the
+    next poll.
+    """
+
+    def __init__(
+        self, source, out_path, merge, skip_unchanged=False, cache=None, component=None
+    ):
+        self.source = source
+        self.out_path = out_path
+        self.merge = merge
+        self.skip_unchanged = skip_unchanged
+        self.cache = cache
+        self.component = component
+        self.__models = dict()
+        # Model path -> names of its txt files
+        self.__txt_names = dict()
+        self.__errors = dict()
+
+    def poll(self):
+        """Convert new and changed models, return the number of written files."""
+        written = 0
+        models = dict()
+        txt_names = dict()
+
+        for model_path in self.__find_model_paths():
+            model = self.__models.get(model_path)
+
+            try:
+                if model is None:
+                    model = Model(model_path, self.cache, self.source, self.component)
+                    changed = None
+                else:
+                    changed = model.refresh()
+
+                    if not changed:
+                        models[model_path] = model
+                        txt_names[model_path] = self.__txt_names[model_path]
+                        continue
+
+                w, _ = model.print(
+                    self.out_path, self.merge, self.skip_unchanged, changed
+                )
+                written += w
+                self.__report(model_path, model.errors)
+            except (RuntimeError, OSError, ET.ParseError) as e:
+                error = "{}: {}".format(type(e).__name__, e)
+                self.__report(model_path, {model_path: error})
+
+            if model is not None:
+                models[model_path] = model
+                txt_names[model_path] = model.get_txt_names(
+                    self.merge, include_errors=True
+                )
+
+        self.__remove_txt_files(txt_names)
+        self.__models = models
+        self.__txt_names = txt_names
+        return written
+
+    def run(self, interval=POLL_INTERVAL):
+        """Poll until interrupted."""
+        while True:
+            time.sleep(interval)
+
+            written = self.poll()
+            if written:
+                print("{} txt files were updated".format(written))
+
+    def __find_model_paths(self):
+        try:
+            model_paths = self.source.find_model_paths()
+        except RuntimeError:
+            # All models were removed, they may reappear
+            return []
+
+        if self.component:
+            model_paths = [
+                x for x in model_paths if Model.contains(x, self.component, self.source)
+            ]
+
+        return model_paths
+
+    def __remove_txt_files(self, txt_names):
+        # Txt files written before and not belonging to any model anymore
+        new = {x for names in txt_names.values() for x in names}
+        old = {x for names in self.__txt_names.values() for x in names}
+
+        for txt_name in sorted(old - new):
+            try:
+                os.remove(os.path.join(self.out_path, txt_name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print("{}: {}".format(type(e).__name__, e), file=sys.stderr)
+
+    def __report(self, model_path, errors):
+        # Errors are {path: message}, only new ones are printed
+        old = self.__errors.get(model_path, dict())
+
+        for path, error in errors.items():
+            if old.get(path) != error:
+                print("{}: {}".format(path, error), file=sys.stderr)
+
+        self.__errors[model_path] = dict(errors)
@@ -2,11 +2,17 @@
 # Use of this source code is governed by the MIT license that can be
 # found in the LICENSE file.
 
+import re
+
 import setuptools
 
+version = re.search(
+    r'__version__ = "(.+)"', open("eventb_to_txt/__init__.py", encoding="utf8").read()
+).group(1)
+
 setuptools.setup(
     name="eventb-to-txt",
-    version="1.6",
+    version=version,
     author="Ilya Shchepetkov",
     author_email="ilya.shchepetkov@gmail.com",
     license="LICENSE.txt",
@@ -0,0 +1,113 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+import contextlib
+import io
+import os
+import tarfile
+import unittest
+import unittest.mock
+import zipfile
+
+import eventb_to_txt
+from eventb_to_txt.__main__ import main
+
+test_model = os.path.join(os.path.dirname(__file__), "test_model")
+
+
+def read_model():
+    files = dict()
+
+    for name in sorted(os.listdir(test_model)):
+        if name.endswith((".buc", ".bum")):
+            with open(os.path.join(test_model, name), "rb") as f:
+                files[name] = f.read()
+
+    return files
+
+
+def read_expected(name):
+    with open(os.path.join(test_model, name + "_expected.txt"), encoding="utf8") as f:
+        return f.read()
+
+
+def no_file_system(*args, **kwargs):
+    raise AssertionError("File system is accessed")
+
+
+class TestAPI(unittest.TestCase):
+    def setUp(self):
+        self.files = read_model()
+
+    def test_render_component(self):
+        with open(os.path.join(test_model, "M1.bum"), "rb") as f:
+            self.assertEqual(
+                eventb_to_txt.render_component(f, "M1.bum"), read_expected("M1")
+            )
+
+        self.assertEqual(
+            eventb_to_txt.render_component(self.files["C0.buc"], "C0.buc"),
+            read_expected("C0"),
+        )
+
+    def test_render_model(self):
+        with contextlib.ExitStack() as stack:
+            for target in ("builtins.open", "os.path.exists", "os.stat", "os.scandir"):
+                stack.enter_context(unittest.mock.patch(target, no_file_system))
+
+            rendered = eventb_to_txt.render_model(self.files)
+            merged = eventb_to_txt.render_model(self.files, merge=True)
+
+        self.assertEqual(len(rendered), 6)
+        for txt_name, text in rendered:
+            self.assertEqual(text, read_expected(os.path.splitext(txt_name)[0]))
+
+        self.assertEqual([x for x, _ in merged], ["model.txt"] * 6)
+
+    def test_write_model(self):
+        stream = io.StringIO()
+        eventb_to_txt.write_model(self.files, stream, merge=True)
+
+        stdout = io.StringIO()
+        with unittest.mock.patch("sys.stdout", stdout):
+            main([test_model, "-o", "-"])
+
+        self.assertEqual(stream.getvalue(), stdout.getvalue())
+
+    def test_zip(self):
+        with io.BytesIO() as f:
+            with zipfile.ZipFile(f, "w") as zip_f:
+                for name, data in self.files.items():
+                    zip_f.writestr("project/" + name, data)
+
+            rendered = eventb_to_txt.render_model(f.getvalue(), merge=True)
+
+        self.assertEqual({x for x, _ in rendered}, {"project.txt"})
+
+    def test_tar(self):
+        with io.BytesIO() as f:
+            with tarfile.open(fileobj=f, mode="w:gz") as tar_f:
+                for name, data in self.files.items():
+                    info = tarfile.TarInfo("./project/" + name)
+                    info.size = len(data)
+                    tar_f.addfile(info, io.BytesIO(data))
+
+            rendered = eventb_to_txt.render_model(f.getvalue(), merge=True)
+
+        expected = eventb_to_txt.render_model(self.files, merge=True)
+        self.assertEqual({x for x, _ in rendered}, {"project.txt"})
+        self.assertEqual([x for _, x in rendered], [x for _, x in expected])
+
+    def test_component(self):
+        rendered = eventb_to_txt.render_model(self.files, component="M1")
+        self.assertEqual(
+            [x for x, _ in rendered], ["C0.txt", "C1.txt", "M0.txt", "M1.txt"]
+        )
+
+        with self.assertRaises(RuntimeError):
+            eventb_to_txt.render_model(self.files, component="M9")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+
+import pytest
+
+from eventb_to_txt.__main__ import main
+from eventb_to_txt.diff import compare
+from eventb_to_txt.source import DirectorySource
+
+test_model = os.path.join(os.path.dirname(__file__), "test_model")
+
+
+@pytest.fixture
+def versions(tmpdir):
+    old = tmpdir.join("old")
+    new = tmpdir.join("new")
+    shutil.copytree(test_model, str(old))
+    shutil.copytree(test_model, str(new))
+
+    m1 = new.join("M1.bum")
+    m1.write(
+        m1.read().replace(
+            'org.eventb.core.label="grd1"', 'org.eventb.core.label="grd9"'
+        )
+    )
+
+    # Formatting of the XML is not a change
+    c0 = new.join("C0.buc")
+    c0.write(c0.read().replace('"/>', '"  />'))
+
+    new.join("M3.bum").remove()
+    new.join("M2.bum").copy(new.join("M4.bum"))
+    return old, new
+
+
+def test_compare(versions):
+    old, new = versions
+    changes = compare(DirectorySource(str(old)), DirectorySource(str(new)))
+
+    assert [(x.path, x.status) for x in changes] == [
+        ("M1.bum", "changed"),
+        ("M4.bum", "added"),
+        ("M3.bum", "removed"),
+    ]
+    assert changes[0].clauses == ["event evt2: guards"]
+
+
+def test_main_diff(versions, tmpdir, capsys):
+    old, new = versions
+    out = tmpdir.mkdir("out")
+
+    main([str(new), "--diff", str(old), "-o", str(out)])
+
+    assert sorted(x.basename for x in out.listdir()) == ["M1.txt", "M4.txt"]
+    assert "Components: 1 changed, 1 added, 1 removed" in capsys.readouterr().out
+
+
+def test_main_diff_unchanged(tmpdir, capsys):
+    main([test_model, "--diff", test_model, "-o", "-"])
+
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "Components: 0 changed, 0 added, 0 removed" in captured.err
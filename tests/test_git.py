@@ -0,0 +1,90 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from eventb_to_txt.__main__ import main
+from eventb_to_txt.source import GitSource
+
+test_model = os.path.join(os.path.dirname(__file__), "test_model")
+
+pytestmark = pytest.mark.skipif(not shutil.which("git"), reason="git is missing")
+
+
+def git(repo, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        + list(args),
+        cwd=str(repo),
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+@pytest.fixture
+def repo(tmpdir):
+    res = tmpdir.mkdir("repo")
+    shutil.copytree(test_model, str(res.join("project")))
+    git(res, "init", "-q")
+    git(res, "add", ".")
+    git(res, "commit", "-q", "-m", "v1")
+    git(res, "tag", "v1")
+
+    # Working tree changes are not seen in the revision
+    m1 = res.join("project", "M1.bum")
+    m1.write(m1.read().replace("evt1", "evt9"))
+    return res
+
+
+def test_git_source(repo):
+    source = GitSource(str(repo), "v1")
+
+    try:
+        assert source.find_model_paths() == [str(repo.join("project"))]
+
+        path = str(repo.join("project", "M1.bum"))
+        with source.open(path) as f:
+            data = f.read()
+
+        assert b"evt9" not in data
+        assert source.get_size(path) == len(data)
+    finally:
+        source.close()
+
+
+def test_main_git(repo, tmpdir):
+    expected = tmpdir.mkdir("expected")
+    out = tmpdir.mkdir("out")
+
+    main([test_model, "-o", str(expected), "-m"])
+    main([str(repo.join("project")), "--rev", "v1", "-o", str(out), "-m"])
+
+    assert out.join("project.txt").read() == expected.join("test_model.txt").read()
+
+
+def test_main_git_cache(repo, tmpdir, capsys, monkeypatch):
+    cache_dir = str(tmpdir.join("cache"))
+    out = tmpdir.mkdir("out")
+
+    main([str(repo), "--rev", "v1", "-o", str(out), "--cache-dir", cache_dir])
+    assert "0 hits, 6 misses" in capsys.readouterr().err
+
+    # Blobs rendered before are not read again
+    def read_blob(self, object_id):
+        raise AssertionError(object_id)
+
+    monkeypatch.setattr(GitSource, "read_blob", read_blob)
+    main([str(repo), "--rev", "v1", "-o", str(out), "--cache-dir", cache_dir])
+    assert "6 hits, 0 misses" in capsys.readouterr().err
+
+
+def test_main_git_bad_revision(repo, tmpdir):
+    with pytest.raises(SystemExit) as e:
+        main([str(repo), "--rev", "v9", "-o", str(tmpdir)])
+
+    assert "v9" in str(e.value)
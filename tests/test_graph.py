@@ -0,0 +1,87 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+import pytest
+
+from eventb_to_txt.graph import DependencyGraph
+
+
+class Component:
+    def __init__(self, name, *dependencies):
+        self.name = name
+        self.dependencies = list(dependencies)
+
+    def get_component_name(self):
+        return self.name
+
+    def get_dependencies(self):
+        return self.dependencies
+
+
+def names(components):
+    return [x.get_component_name() for x in components]
+
+
+def test_graph_order():
+    graph = DependencyGraph(
+        [
+            Component("C0"),
+            Component("C1", "C0"),
+            Component("M0", "C0"),
+            Component("M1", "M0", "C1"),
+            Component("M2", "M1"),
+        ]
+    )
+
+    assert names(graph.order()) == ["C0", "M0", "C1", "M1", "M2"]
+
+
+def test_graph_leaves():
+    graph = DependencyGraph(
+        [Component("C0"), Component("M0", "C0"), Component("M1", "C0")]
+    )
+
+    assert names(graph.leaves()) == ["M1", "M0"]
+    assert names(graph.order()) == ["C0", "M1", "M0"]
+
+
+def test_graph_diamond():
+    components = [Component("C0")]
+    for i in range(1, 100):
+        components.append(Component("C{}".format(i), "C{}".format(i - 1)))
+        components.append(Component("D{}".format(i), "C{}".format(i - 1)))
+    components.append(Component("M", *names(components)))
+
+    graph = DependencyGraph(components)
+
+    assert len(graph.order()) == len(components)
+
+
+def test_graph_cycle():
+    graph = DependencyGraph(
+        [
+            Component("C0", "C2"),
+            Component("C1", "C0"),
+            Component("C2", "C1"),
+            Component("M", "C2"),
+        ]
+    )
+
+    with pytest.raises(RuntimeError, match="Cyclic dependency"):
+        graph.order()
+
+
+def test_graph_pure_cycle():
+    graph = DependencyGraph([Component("CA", "CB"), Component("CB", "CA")])
+
+    assert graph.leaves() == []
+    with pytest.raises(RuntimeError, match="Cyclic dependency"):
+        graph.order()
+
+
+def test_graph_missing():
+    graph = DependencyGraph([Component("M1", "M0")])
+
+    with pytest.raises(RuntimeError):
+        graph.order()
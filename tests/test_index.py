@@ -0,0 +1,77 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+import json
+import os
+import shutil
+
+import pytest
+
+from eventb_to_txt.__main__ import main
+from eventb_to_txt.index import INDEX_NAME, Index
+from eventb_to_txt.model import Model
+
+test_model = os.path.join(os.path.dirname(__file__), "test_model")
+
+
+@pytest.fixture
+def model_dir(tmpdir):
+    res = tmpdir.join("model")
+    shutil.copytree(test_model, str(res))
+    return res
+
+
+def test_index_build(model_dir):
+    m = Model(str(model_dir), index=True)
+    m.render(False)
+
+    index = Index.load(str(model_dir))
+    assert index.order == [os.path.basename(x.path) for x in m.graph.order()]
+    assert index.find(sees="C1") == ["M1"]
+    assert index.find(refines="M0") == ["M1"]
+    assert index.find(extends="C0") == ["C1"]
+    assert [os.path.basename(x) for x in index.closure("M1")] == [
+        "M0.bum",
+        "C0.buc",
+        "C1.buc",
+        "M1.bum",
+    ]
+
+
+def test_index_invalidation(model_dir):
+    Model(str(model_dir), index=True).render(False)
+    index = Index.load(str(model_dir))
+    assert index.is_valid(index.get_paths())
+
+    model_dir.join("M3.bum").remove()
+    assert not index.is_valid(index.get_paths())
+
+    Model(str(model_dir), index=True).render(False)
+    assert "M3.bum" not in Index.load(str(model_dir)).order
+
+
+def test_main_index(model_dir, tmpdir):
+    expected = tmpdir.mkdir("expected")
+    out = tmpdir.mkdir("out")
+    stats_path = tmpdir.join("stats.json")
+
+    main([str(model_dir), "-o", str(expected), "-m"])
+    main([str(model_dir), "-o", str(out), "-m", "--index"])
+    assert model_dir.join(INDEX_NAME).check()
+
+    args = [str(model_dir), "-o", str(out), "--index", "--component", "M1"]
+    main(args + ["--stats", str(stats_path)])
+
+    # Headers are not scanned while the index is valid
+    assert "scan" not in json.loads(stats_path.read())["phases"]
+    assert sorted(x.basename for x in out.listdir()) == [
+        "C0.txt",
+        "C1.txt",
+        "M0.txt",
+        "M1.txt",
+        "model.txt",
+    ]
+
+    main([str(model_dir), "-o", str(out), "-m", "--index"])
+    assert out.join("model.txt").read() == expected.join("model.txt").read()
@@ -2,11 +2,27 @@
 # Use of this source code is governed by the MIT license that can be
 # found in the LICENSE file.
 
+import gc
+import io
+import json
 import os
 import pytest
 import shutil
+import socket
+import threading
+import weakref
 
+import eventb_to_txt.cache
+import eventb_to_txt.model
+from eventb_to_txt import render_model, stats
 from eventb_to_txt.__main__ import main
+from eventb_to_txt.abstract import EventBComponent
+from eventb_to_txt.context import Context
+from eventb_to_txt.machine import Machine
+from eventb_to_txt.model import Model
+from eventb_to_txt.output import AtomicFile
+from eventb_to_txt.source import DirectorySource, MemorySource
+from eventb_to_txt.watch import Watcher
 
 test_model = os.path.join(os.path.dirname(__file__), "test_model")
 
@@ -43,3 +59,608 @@ def test_main_zipfile(tmpdir):
         os.path.join(str(tmpdir), "test_model"), "zip", root_dir=test_model
     )
     main([test_zipfile, "-o", str(tmpdir)])
+
+
+def test_main_jobs(tmpdir):
+    serial = tmpdir.mkdir("serial")
+    parallel = tmpdir.mkdir("parallel")
+
+    main([test_model, "-o", str(serial), "-m"])
+    main([test_model, "-o", str(parallel), "-m", "-j", "2"])
+
+    assert (
+        serial.join("test_model.txt").read() == parallel.join("test_model.txt").read()
+    )
+
+
+def test_main_tarfile(tmpdir):
+    test_tarfile = shutil.make_archive(
+        os.path.join(str(tmpdir), "test_model"), "gztar", root_dir=test_model
+    )
+    tar_out = tmpdir.mkdir("tar_out")
+    dir_out = tmpdir.mkdir("dir_out")
+
+    main([test_tarfile, "-o", str(tar_out), "-m"])
+    main([test_model, "-o", str(dir_out), "-m"])
+
+    assert (
+        tar_out.join("test_model.txt").read() == dir_out.join("test_model.txt").read()
+    )
+
+
+def test_main_stdin(tmpdir, monkeypatch):
+    test_tarfile = shutil.make_archive(
+        os.path.join(str(tmpdir), "test_model"), "xztar", root_dir=test_model
+    )
+    out = tmpdir.mkdir("out")
+
+    with open(test_tarfile, "rb") as f:
+        monkeypatch.setattr("sys.stdin", io.TextIOWrapper(f))
+        main(["-", "-o", str(out)])
+
+    assert sorted(x.basename for x in out.listdir()) == [
+        "C0.txt",
+        "C1.txt",
+        "M0.txt",
+        "M1.txt",
+        "M2.txt",
+        "M3.txt",
+    ]
+
+
+def test_main_stdin_jobs(tmpdir, monkeypatch):
+    in_path = tmpdir.mkdir("in")
+    shutil.copytree(test_model, str(in_path.join("a")))
+    shutil.copytree(test_model, str(in_path.join("b")))
+    test_tarfile = shutil.make_archive(
+        os.path.join(str(tmpdir), "models"), "gztar", root_dir=str(in_path)
+    )
+    expected = tmpdir.mkdir("expected")
+    out = tmpdir.mkdir("out")
+
+    main([str(in_path), "-o", str(expected), "-m"])
+
+    with open(test_tarfile, "rb") as f:
+        monkeypatch.setattr("sys.stdin", io.TextIOWrapper(f))
+        main(["-", "-o", str(out), "-m", "-j", "2"])
+
+    for name in ("a.txt", "b.txt"):
+        assert out.join(name).read() == expected.join(name).read()
+
+    # Workers get the component files of their models only
+    with open(test_tarfile, "rb") as f:
+        source = MemorySource.from_tar(f)
+
+    a = source.for_model(os.path.join("model", "a"))
+    assert sorted(os.path.basename(x) for x in a.members) == [
+        "C0.buc",
+        "C1.buc",
+        "M0.bum",
+        "M1.bum",
+        "M2.bum",
+        "M3.bum",
+    ]
+    assert a.find_model_paths() == [os.path.join("model", "a")]
+    assert len(source.members) == 2 * len(a.members)
+
+
+def test_main_jobs_error(tmpdir):
+    in_path = tmpdir.mkdir("in")
+    shutil.copytree(test_model, str(in_path.join("good")))
+    in_path.mkdir("bad").join("M.bum").write("not xml")
+    out_path = tmpdir.mkdir("out")
+
+    with pytest.raises(SystemExit) as e:
+        main([str(in_path), "-o", str(out_path), "-m", "-j", "2"])
+
+    assert "bad" in str(e.value)
+    assert out_path.join("good.txt").check()
+
+
+def test_main_cache(tmpdir, capsys):
+    cache_dir = str(tmpdir.join("cache"))
+
+    main([test_model, "-o", str(tmpdir), "-m", "--cache-dir", cache_dir])
+    assert "0 hits, 6 misses" in capsys.readouterr().err
+    uncached = tmpdir.join("test_model.txt").read()
+
+    main([test_model, "-o", str(tmpdir), "-m", "--cache-dir", cache_dir])
+    assert "6 hits, 0 misses" in capsys.readouterr().err
+    assert tmpdir.join("test_model.txt").read() == uncached
+
+    main([test_model, "-o", str(tmpdir), "--cache-dir", cache_dir, "--cache-size", "0"])
+    assert not os.listdir(cache_dir)
+
+
+def test_main_cache_format(tmpdir, capsys, monkeypatch):
+    cache_dir = str(tmpdir.join("cache"))
+
+    main([test_model, "-o", str(tmpdir), "--cache-dir", cache_dir])
+    assert "0 hits, 6 misses" in capsys.readouterr().err
+
+    # Entries written in another format are not used
+    monkeypatch.setattr(eventb_to_txt.cache, "CACHE_FORMAT", -1)
+    main([test_model, "-o", str(tmpdir), "--cache-dir", cache_dir])
+    assert "0 hits, 6 misses" in capsys.readouterr().err
+
+
+def test_main_zipfile_merge(tmpdir):
+    test_zipfile = shutil.make_archive(
+        os.path.join(str(tmpdir), "test_model"), "zip", root_dir=test_model
+    )
+    zip_out = tmpdir.mkdir("zip_out")
+    dir_out = tmpdir.mkdir("dir_out")
+
+    main([test_zipfile, "-o", str(zip_out), "-m"])
+    main([test_model, "-o", str(dir_out), "-m"])
+
+    assert (
+        zip_out.join("test_model.txt").read() == dir_out.join("test_model.txt").read()
+    )
+
+
+def test_main_nested(tmpdir):
+    in_path = tmpdir.mkdir("in")
+    shutil.copytree(test_model, str(in_path.join("parent")))
+    shutil.copytree(test_model, str(in_path.join("parent", "child")))
+    shutil.copytree(test_model, str(in_path.join("parent", ".metadata")))
+    out_path = tmpdir.mkdir("out")
+
+    main([str(in_path), "-o", str(out_path), "-m"])
+
+    assert sorted(os.listdir(str(out_path))) == ["child.txt", "parent.txt"]
+    assert out_path.join("parent.txt").read() == out_path.join("child.txt").read()
+
+    parent = str(in_path.join("parent"))
+    flat = Model(parent, source=DirectorySource(str(in_path)))
+    nested = Model(parent, source=DirectorySource(str(in_path), nested=True))
+
+    assert len(flat.model_objs) == 6
+    assert len(nested.model_objs) == 12
+
+
+def test_main_ignore(tmpdir):
+    in_path = tmpdir.mkdir("in")
+    shutil.copytree(test_model, str(in_path.join("model")))
+    shutil.copytree(test_model, str(in_path.join("build")))
+    out_path = tmpdir.mkdir("out")
+
+    main([str(in_path), "-o", str(out_path), "-m", "--ignore", "build"])
+
+    assert os.listdir(str(out_path)) == ["model.txt"]
+
+
+def test_AtomicFile(tmpdir):
+    txt = tmpdir.join("M.txt")
+    txt.write("old")
+
+    with pytest.raises(RuntimeError):
+        with AtomicFile(str(txt)) as f:
+            f.write("new")
+            raise RuntimeError
+
+    assert txt.read() == "old"
+    assert os.listdir(str(tmpdir)) == ["M.txt"]
+
+    with AtomicFile(str(txt)) as f:
+        f.write("new")
+
+    assert txt.read() == "new"
+
+
+def test_main_skip_unchanged(tmpdir, capsys):
+    main([test_model, "-o", str(tmpdir), "--skip-unchanged"])
+    assert "6 files written, 0 unchanged" in capsys.readouterr().out
+
+    tmpdir.join("M0.txt").write("outdated")
+    mtime = tmpdir.join("M1.txt").mtime()
+    os.utime(str(tmpdir.join("M1.txt")), (mtime - 10, mtime - 10))
+
+    main([test_model, "-o", str(tmpdir), "--skip-unchanged"])
+    assert "1 files written, 5 unchanged" in capsys.readouterr().out
+    assert tmpdir.join("M1.txt").mtime() == mtime - 10
+    assert tmpdir.join("M0.txt").read() != "outdated"
+
+
+def test_main_skip_unchanged_no_write(tmpdir, capsys, monkeypatch):
+    main([test_model, "-o", str(tmpdir), "-m", "--skip-unchanged"])
+    capsys.readouterr()
+
+    # Unchanged files are not written even to a temporary file
+    def atomic_file(*args, **kwargs):
+        raise AssertionError("unchanged file is written")
+
+    monkeypatch.setattr("eventb_to_txt.output.AtomicFile", atomic_file)
+    main([test_model, "-o", str(tmpdir), "-m", "--skip-unchanged"])
+    assert "0 files written, 1 unchanged" in capsys.readouterr().out
+
+
+def test_main_stats(tmpdir):
+    stats_path = tmpdir.join("stats.json")
+
+    main([test_model, "-o", str(tmpdir), "-m", "--stats", str(stats_path)])
+
+    stats = json.loads(stats_path.read())
+    assert stats["phases"]["parse"]["calls"] == 6
+    assert stats["phases"]["render"]["calls"] == 6
+    assert {"discovery", "ordering", "write"} <= set(stats["phases"])
+    assert len(stats["slowest_components"]) == 6
+
+
+def test_main_streams_components(tmpdir, monkeypatch, capsys):
+    def fail(self):
+        raise AssertionError("{} is rendered to a string".format(self.path))
+
+    monkeypatch.setattr(EventBComponent, "__str__", fail)
+
+    # Components are streamed to txt files and stdout, never kept as text
+    main([test_model, "-o", str(tmpdir.mkdir("out"))])
+    main([test_model, "-o", str(tmpdir.mkdir("merged")), "-m"])
+    main([test_model, "-o", "-"])
+
+    assert capsys.readouterr().out.count("machine ") == 4
+
+
+def test_shared_texts(tmpdir):
+    files = {
+        "p{}/{}".format(i, x): open(os.path.join(test_model, x), "rb").read()
+        for i in (1, 2)
+        for x in os.listdir(test_model)
+        if x.endswith((".buc", ".bum"))
+    }
+
+    s = stats.enable()
+    try:
+        rendered = render_model(files, merge=True)
+    finally:
+        stats.disable()
+
+    # Byte-identical components of both models are rendered once
+    assert len(rendered) == 12
+    assert s.to_dict()["phases"]["parse"]["calls"] == 12
+    assert s.to_dict()["phases"]["render"]["calls"] == 6
+
+
+def test_main_component(tmpdir):
+    main([test_model, "-o", str(tmpdir), "--component", "M1"])
+
+    assert sorted(x.basename for x in tmpdir.listdir()) == [
+        "C0.txt",
+        "C1.txt",
+        "M0.txt",
+        "M1.txt",
+    ]
+
+
+def test_main_component_merge(tmpdir):
+    main([test_model, "-o", str(tmpdir), "-m", "--component", "M1"])
+
+    text = tmpdir.join("test_model.txt").read()
+    assert text.index("context C0") < text.index("context C1")
+    assert text.index("context C1") < text.index("machine M1")
+    assert "machine M2" not in text
+
+
+def test_main_component_scan_error(tmpdir):
+    model_dir = tmpdir.join("model")
+    shutil.copytree(test_model, str(model_dir))
+    model_dir.join("M3.bum").write("not xml")
+    model_dir.join("M4.bum").write(
+        '<?xml version="1.0"?><org.eventb.core.machineFile>'
+        '<org.eventb.core.refinesMachine name="r"/></org.eventb.core.machineFile>'
+    )
+    out = tmpdir.mkdir("out")
+
+    # Files outside of the ancestors of M1 are not reported
+    main([str(model_dir), "-o", str(out), "--component", "M1"])
+    assert sorted(x.basename for x in out.listdir()) == [
+        "C0.txt",
+        "C1.txt",
+        "M0.txt",
+        "M1.txt",
+    ]
+
+    # Ancestors that can't be scanned are reported
+    model_dir.join("M0.bum").write("not xml")
+
+    with pytest.raises(SystemExit) as e:
+        main([str(model_dir), "-o", str(tmpdir.mkdir("out2")), "--component", "M1"])
+
+    assert "M0.bum: ExpatError" in str(e.value)
+    assert "M3.bum" not in str(e.value)
+
+    with pytest.raises(SystemExit) as e:
+        main([str(model_dir), "-o", str(tmpdir.mkdir("out3")), "--component", "M4"])
+
+    assert "M4.bum: Missing attribute" in str(e.value)
+
+
+def test_main_component_missing(tmpdir):
+    with pytest.raises(SystemExit):
+        main([test_model, "-o", str(tmpdir), "--component", "M9"])
+
+
+def test_model_refresh(tmpdir):
+    model_dir = tmpdir.join("model")
+    shutil.copytree(test_model, str(model_dir))
+
+    m = Model(str(model_dir))
+    m.render(False)
+    assert m.refresh() == []
+
+    # Touched, but not changed
+    os.utime(str(model_dir.join("M0.bum")), (0, 0))
+    assert m.refresh() == []
+
+    model_dir.join("M3.bum").remove()
+    m1 = model_dir.join("M1.bum")
+    m1.write(m1.read().replace("evt1", "evt9"))
+
+    assert m.refresh() == [str(model_dir.join("M1.bum")), str(model_dir.join("M3.bum"))]
+    assert "evt9" in dict(m.render(False))["M1.txt"]
+    assert len(m.model_objs) == 5
+
+
+def test_main_partial(tmpdir):
+    model_dir = tmpdir.join("model")
+    shutil.copytree(test_model, str(model_dir))
+    model_dir.join("M3.bum").write("not xml")
+    out = tmpdir.mkdir("out")
+
+    with pytest.raises(SystemExit) as e:
+        main([str(model_dir), "-o", str(out)])
+
+    assert "M3.bum: ParseError" in str(e.value)
+    assert sorted(x.basename for x in out.listdir()) == [
+        "C0.txt",
+        "C1.txt",
+        "M0.txt",
+        "M1.txt",
+        "M2.txt",
+    ]
+
+
+def test_model_errors(tmpdir):
+    model_dir = tmpdir.join("model")
+    shutil.copytree(test_model, str(model_dir))
+    m2 = model_dir.join("M2.bum")
+    m2.write(m2.read().replace('org.eventb.core.convergence="', 'x="'))
+
+    m = Model(str(model_dir))
+    assert [x for x, _ in m.render(True)] == []
+    assert len(m.render(False)) == 5
+    assert m.errors == {str(m2): "Missing attribute 'org.eventb.core.convergence'"}
+
+
+def test_model_release(tmpdir, monkeypatch):
+    components = weakref.WeakSet()
+    alive = []
+
+    def track(cls):
+        def load(*args):
+            obj = cls(*args)
+            components.add(obj)
+            return obj
+
+        return load
+
+    def write_txt(*args, **kwargs):
+        gc.collect()
+        alive.append(len(components))
+        return 1, 0
+
+    monkeypatch.setattr(eventb_to_txt.model, "Context", track(Context))
+    monkeypatch.setattr(eventb_to_txt.model, "Machine", track(Machine))
+    monkeypatch.setattr(eventb_to_txt.model, "write_txt", write_txt)
+
+    # Each component is parsed when its txt file is written
+    m = Model(test_model)
+    assert m.print(str(tmpdir), False, release=True) == (6, 0)
+    assert alive == [1] * 6
+
+
+def test_main_serve_no_unix_sockets(tmpdir, monkeypatch):
+    monkeypatch.delattr(socket, "AF_UNIX", raising=False)
+
+    for args in (["--serve", "s.sock"], ["--connect", "s.sock", test_model]):
+        with pytest.raises(SystemExit) as e:
+            main(args + ["-o", str(tmpdir)])
+
+        assert "Unix sockets" in str(e.value)
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are missing")
+def test_main_serve(tmpdir):
+    from eventb_to_txt.server import Server
+
+    model_dir = tmpdir.join("model")
+    shutil.copytree(test_model, str(model_dir))
+    expected = tmpdir.mkdir("expected")
+    main([str(model_dir), "-o", str(expected), "-m"])
+
+    socket_path = str(tmpdir.join("server.sock"))
+    server = Server(socket_path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    try:
+        out = tmpdir.join("out")
+        main(["--connect", socket_path, str(model_dir), "-o", str(out), "-m"])
+        assert out.join("model.txt").read() == expected.join("model.txt").read()
+
+        m0 = model_dir.join("M0.bum")
+        m0.write(m0.read().replace("evt1", "evt9"))
+
+        threads = [
+            threading.Thread(
+                target=main,
+                args=(["--connect", socket_path, str(model_dir), "-o", str(out)],),
+            )
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert "evt9" in out.join("M0.txt").read()
+
+        with pytest.raises(SystemExit):
+            main(["--connect", socket_path, str(model_dir), "--component", "M9"])
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    assert not os.path.exists(socket_path)
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are missing")
+def test_serve_invalid_request(tmpdir):
+    from eventb_to_txt.server import Server, send_request
+
+    socket_path = str(tmpdir.join("server.sock"))
+    server = Server(socket_path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    try:
+        requests = [
+            [test_model],
+            {"out_path": str(tmpdir)},
+            {"in_path": 1},
+            {"in_path": test_model, "merge": "yes"},
+            {"in_path": test_model, "ignore": [None]},
+        ]
+
+        # Each malformed request gets an error instead of a dropped connection
+        for request in requests:
+            response = send_request(socket_path, request)
+            assert response["error"].startswith("Invalid request: ")
+
+        assert "written" in send_request(
+            socket_path, {"in_path": test_model, "out_path": str(tmpdir)}
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def test_watcher(tmpdir, capsys):
+    model_dir = tmpdir.join("model")
+    shutil.copytree(test_model, str(model_dir))
+    out = tmpdir.mkdir("out")
+
+    watcher = Watcher(DirectorySource(str(model_dir)), str(out), merge=False)
+    assert watcher.poll() == 6
+    assert watcher.poll() == 0
+
+    m1 = model_dir.join("M1.bum")
+    m1.write(m1.read().replace("evt1", "evt9"))
+    assert watcher.poll() == 1
+    assert "evt9" in out.join("M1.txt").read()
+
+    # Broken file is reported once and converted when it is fixed
+    text = m1.read()
+    m1.write(text[:100])
+    assert watcher.poll() == 0
+    assert watcher.poll() == 0
+    assert capsys.readouterr().err.count("ParseError") == 1
+
+    m1.write(text.replace("evt9", "evt8"))
+    assert watcher.poll() == 1
+    assert "evt8" in out.join("M1.txt").read()
+
+
+def test_watcher_merge(tmpdir):
+    model_dir = tmpdir.join("model")
+    shutil.copytree(test_model, str(model_dir))
+    out = tmpdir.mkdir("out")
+
+    watcher = Watcher(DirectorySource(str(model_dir)), str(out), merge=True)
+    assert watcher.poll() == 1
+
+    model_dir.join("M3.bum").remove()
+    assert watcher.poll() == 1
+    assert "machine M3" not in out.join("model.txt").read()
+
+
+def test_watcher_removed_components(tmpdir):
+    model_dir = tmpdir.join("model")
+    shutil.copytree(test_model, str(model_dir))
+    out = tmpdir.mkdir("out")
+    out.join("other.txt").write("")
+
+    watcher = Watcher(DirectorySource(str(model_dir)), str(out), merge=False)
+    assert watcher.poll() == 6
+    assert watcher.poll() == 0
+    assert len(out.listdir()) == 7
+
+    # Txt files of removed components are deleted, other files are kept
+    model_dir.join("M3.bum").remove()
+    assert watcher.poll() == 0
+    assert not out.join("M3.txt").check()
+    assert sorted(x.basename for x in out.listdir()) == [
+        "C0.txt",
+        "C1.txt",
+        "M0.txt",
+        "M1.txt",
+        "M2.txt",
+        "other.txt",
+    ]
+
+    # Broken components keep their txt files
+    model_dir.join("M2.bum").write("not xml")
+    watcher.poll()
+    assert out.join("M2.txt").check()
+
+
+def test_main_batch(tmpdir, capsys):
+    test_zipfile = shutil.make_archive(
+        os.path.join(str(tmpdir), "archive"), "zip", root_dir=test_model
+    )
+    list_file = tmpdir.join("list.txt")
+    list_file.write(os.path.join(test_model, "M0.bum") + "\n\n" + test_model + "\n")
+    out = tmpdir.join("out")
+
+    with pytest.raises(SystemExit, match="1 of 5 paths were not converted"):
+        main(
+            [
+                test_model,
+                test_zipfile,
+                os.path.join(str(tmpdir), "does_not_exist"),
+                "@" + str(list_file),
+                "-o",
+                str(out),
+                "-m",
+            ]
+        )
+
+    assert "does_not_exist" in capsys.readouterr().err
+    assert sorted(x.basename for x in out.listdir()) == [
+        "M0",
+        "archive",
+        "test_model",
+        "test_model-2",
+    ]
+    assert (
+        out.join("test_model", "test_model.txt").read()
+        == out.join("test_model-2", "test_model.txt").read()
+    )
+    assert out.join("archive", "archive.txt").check()
+    assert out.join("M0", "test_model.txt").check()
+
+
+def test_main_stdin_once(tmpdir, monkeypatch):
+    for args in (
+        ["@-", "-"],
+        ["@-", "@-"],
+        ["-", "--diff", "-"],
+        ["@-", "--diff", "-"],
+    ):
+        stdin = io.TextIOWrapper(io.BytesIO(test_model.encode("utf8") + b"\n"))
+        monkeypatch.setattr("sys.stdin", stdin)
+
+        with pytest.raises(SystemExit, match="Stdin can be read only once"):
+            main(args + ["-o", str(tmpdir)])
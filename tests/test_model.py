@@ -2,11 +2,19 @@
 # Use of this source code is governed by the MIT license that can be
 # found in the LICENSE file.
 
+import io
 import os
 import unittest
+import unittest.mock
 
 import utils
 
+from eventb_to_txt import text
+from eventb_to_txt.abstract import EventBComponent
+from eventb_to_txt.context import Context
+from eventb_to_txt.machine import Machine
+from eventb_to_txt.records import Guard, Identifier
+
 test_model = os.path.join(os.path.dirname(__file__), "test_model")
 
 
@@ -50,5 +58,60 @@ class TestMachine(utils.EventBTestCase):
         self.compare_machine(M, M_expected)
 
 
+class TestRecords(unittest.TestCase):
+    def test_records_M1(self):
+        m = Machine(os.path.join(test_model, "M1.bum"))
+        evt2 = m.events[2]
+
+        self.assertEqual(evt2.refines, "evt1")
+        self.assertEqual(evt2.parameters, [Identifier("prm2")])
+        self.assertEqual(
+            evt2.guards[2], Guard("grd3", "var1 > 0", None, "multiline\ncomment")
+        )
+        self.assertEqual(m.events[0].guards, ())
+
+
+class TestRender(utils.EventBTestCase):
+    def test_render_to(self):
+        for name in ("C0.buc", "C1.buc", "M0.bum", "M1.bum", "M2.bum", "M3.bum"):
+            path = os.path.join(test_model, name)
+            component = Context(path) if name.endswith(".buc") else Machine(path)
+            expected = os.path.splitext(path)[0] + "_expected.txt"
+
+            stream = io.StringIO()
+            component.render_to(stream)
+
+            self.assertEqual(self._read_file_to_str(expected), stream.getvalue())
+            self.assertEqual(stream.getvalue(), str(component))
+
+    def test_render_once(self):
+        m = Machine(os.path.join(test_model, "M1.bum"))
+
+        with unittest.mock.patch.object(
+            Machine, "_render", side_effect=Machine._render, autospec=True
+        ) as render:
+            self.assertIs(str(m), str(m))
+            m.render_to(io.StringIO())
+
+        self.assertEqual(render.call_count, 1)
+
+    def test_abstract_component(self):
+        with self.assertRaises(TypeError):
+            EventBComponent(os.path.join(test_model, "M1.bum"))
+
+
+class TestText(unittest.TestCase):
+    def test_reindent(self):
+        self.assertEqual(text.reindent("a ∧ b", 4), "a ∧ b")
+        self.assertEqual(text.reindent("a\r\n∧\tb\n∧ c\r", 2), "a\n  ∧    b\n  ∧ c\r")
+        self.assertIs(text.line_break(6), text.line_break(6))
+
+    def test_join_lines(self):
+        self.assertEqual(
+            text.join_lines("multi\r\nline\ncomment"), "multi line comment"
+        )
+        self.assertEqual(text.normalize_newlines("\r\n\n"), "\n\n")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,62 @@
+# Copyright (c) 2018 Ilya Shchepetkov
+# Use of this source code is governed by the MIT license that can be
+# found in the LICENSE file.
+
+import json
+import os
+import shutil
+
+import pytest
+
+from eventb_to_txt.__main__ import main
+from eventb_to_txt.shard import MANIFEST_NAME, assign, combine_manifests
+
+test_model = os.path.join(os.path.dirname(__file__), "test_model")
+
+
+def test_assign():
+    sizes = {"a": 10, "b": 7, "c": 5, "d": 4, "e": 1}
+
+    assert assign(sizes, 2) == [["a", "d"], ["b", "c", "e"]]
+    assert assign(sizes, 1) == [["a", "b", "c", "d", "e"]]
+    assert assign({"a": 1}, 3) == [["a"], [], []]
+
+
+@pytest.fixture
+def workspace(tmpdir):
+    res = tmpdir.mkdir("workspace")
+
+    for name in ("p1", "p2", "p3", "p4", "p5"):
+        shutil.copytree(test_model, str(res.join(name)))
+
+    return res
+
+
+def test_main_shard(workspace, tmpdir):
+    manifests = []
+    outputs = []
+
+    for i in (1, 2, 3):
+        out = tmpdir.mkdir("out{}".format(i))
+        main([str(workspace), "-o", str(out), "-m", "--shard", "{}/3".format(i)])
+
+        with open(str(out.join(MANIFEST_NAME.format(i, 3))), encoding="utf8") as f:
+            manifests.append(json.load(f))
+
+        outputs.extend(x.basename for x in out.listdir() if x.ext == ".txt")
+
+    models = combine_manifests(manifests)
+    assert sorted(x["path"] for x in models) == ["p1", "p2", "p3", "p4", "p5"]
+    assert sorted(outputs) == ["p1.txt", "p2.txt", "p3.txt", "p4.txt", "p5.txt"]
+    assert [y for x in models for y in x["outputs"]] == [
+        x["path"] + ".txt" for x in models
+    ]
+
+    with pytest.raises(RuntimeError):
+        combine_manifests(manifests[1:])
+
+
+def test_main_shard_invalid(workspace):
+    for shard in ("0/3", "4/3", "1", "a/b"):
+        with pytest.raises(SystemExit):
+            main([str(workspace), "-o", "-", "--shard", shard])